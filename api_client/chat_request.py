@@ -0,0 +1,72 @@
+import socket
+import threading
+
+
+class RequestCancelled(Exception):
+    """请求已被用户停止"""
+
+
+class ChatRequest:
+    """一次进行中的对话请求，持有底层 HTTP 响应，供“停止”按钮随时中断"""
+
+    def __init__(self, user_message, messages, history_before, model, temperature, use_cache=True, regenerate=False):
+        self.user_message = user_message
+        self.messages = messages  # 本次请求发送的消息列表（快照）
+        # 发起时在主线程读取的模型和温度，工作线程和完成时的显示都使用这两个值，不再读取 Tk 变量
+        self.model = model
+        self.temperature = temperature
+        self.history_before = history_before  # 发送前的对话历史，用于停止/失败时回滚
+        self.use_cache = use_cache  # 是否允许直接返回响应缓存（重新生成时不使用）
+        self.regenerate = regenerate  # 是否为重新生成：history_before 以被替换的原回复结尾，停止或失败时恢复
+        self.cancel_event = threading.Event()
+        self.stream_started = False
+        self._response = None
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        """是否已被停止"""
+        return self.cancel_event.is_set()
+
+    def attach(self, response):
+        """登记底层响应；若请求已被停止则立即关闭连接"""
+        with self._lock:
+            self._response = response
+            cancelled = self.cancel_event.is_set()
+        if cancelled:
+            self._close(response)
+            raise RequestCancelled()
+
+    def mark_stream_started(self):
+        """标记已开始显示流式回复；请求已被停止时返回 False"""
+        with self._lock:
+            if self.cancel_event.is_set():
+                return False
+            self.stream_started = True
+            return True
+
+    def cancel(self):
+        """停止请求：设置取消标记并立即关闭底层连接，返回停止时是否已开始显示回复"""
+        with self._lock:
+            self.cancel_event.set()
+            response = self._response
+            stream_started = self.stream_started
+        if response is not None:
+            self._close(response)
+        return stream_started
+
+    @staticmethod
+    def _close(response):
+        """关闭响应；先 shutdown 底层 socket，使工作线程中阻塞的读取立即返回"""
+        raw = getattr(response, 'raw', None)
+        connection = getattr(raw, 'connection', None) or getattr(raw, '_connection', None)
+        sock = getattr(connection, 'sock', None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        try:
+            response.close()
+        except Exception as e:
+            print(f"关闭连接失败: {str(e)}")
@@ -0,0 +1,48 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool:
+    """按 API_URL 维护可复用的 keep-alive 会话，避免每次请求重新进行 TCP/TLS 握手"""
+
+    def __init__(self, pool_maxsize=4):
+        self.pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_url):
+        """获取 api_url 对应的会话，不存在时创建"""
+        with self._lock:
+            session = self._sessions.get(api_url)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[api_url] = session
+            return session
+
+    def warm_up(self, api_url):
+        """在后台线程中预先建立到 api_url 的连接，首条消息即可跳过握手耗时"""
+        parts = urlsplit(api_url)
+        if parts.scheme not in ("http", "https") or not parts.netloc:
+            return
+        threading.Thread(target=self._warm_up, args=(api_url,), daemon=True).start()
+
+    def _warm_up(self, api_url):
+        """发送一次 HEAD 请求；状态码无关紧要，响应读完后连接会留在连接池中复用"""
+        try:
+            self.get(api_url).head(api_url, timeout=10)
+        except requests.exceptions.RequestException as e:
+            print(f"预热连接失败: {str(e)}")
+
+    def close(self):
+        """关闭所有会话及其连接"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
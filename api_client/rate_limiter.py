@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟预算，按恒定速率持续补充"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0  # 每秒补充的令牌数
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        """按流逝的时间补充令牌"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """取得 amount 个令牌还需等待的秒数"""
+        self.refill(now)
+        # 单次需求超过桶容量时，等到桶满即可放行，避免永远等待
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        """扣除令牌；允许扣成负数，表示需要用后续的补充来偿还"""
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """客户端限流器：同时限制每分钟请求数(RPM)和每分钟 token 数(TPM)，超出预算的请求按先后顺序排队等待"""
+
+    def __init__(self, rpm=0, tpm=0):
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self.configure(rpm, tpm)
+
+    def configure(self, rpm, tpm):
+        """更新预算，0 表示不限制"""
+        with self._cond:
+            self.rpm = max(0, int(rpm))
+            self.tpm = max(0, int(tpm))
+            self._request_bucket = TokenBucket(self.rpm) if self.rpm else None
+            self._token_bucket = TokenBucket(self.tpm) if self.tpm else None
+            self._cond.notify_all()
+
+    def _wait_time(self, tokens, now):
+        wait = 0.0
+        if self._request_bucket:
+            wait = max(wait, self._request_bucket.wait_time(1, now))
+        if self._token_bucket:
+            wait = max(wait, self._token_bucket.wait_time(tokens, now))
+        return wait
+
+    def acquire(self, tokens=0, cancel_event=None, on_wait=None, poll_interval=0.25):
+        """阻塞直到预算允许发送；on_wait(剩余秒数, 前面排队数) 用于显示等待状态，等待期间被取消时返回 False"""
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    position = self._queue.index(ticket)
+                    wait = self._wait_time(tokens, time.monotonic())
+                    if position == 0 and wait <= 0:
+                        if self._request_bucket:
+                            self._request_bucket.consume(1)
+                        if self._token_bucket:
+                            self._token_bucket.consume(tokens)
+                        return True
+                    if cancel_event is not None and cancel_event.is_set():
+                        return False
+                    if on_wait:
+                        on_wait(wait, position)
+                    self._cond.wait(timeout=min(max(wait, 0.01), poll_interval))
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+    def record_usage(self, extra_tokens):
+        """按实际用量修正 TPM 预算（extra_tokens 为实际用量与预估值之差）"""
+        with self._cond:
+            if self._token_bucket and extra_tokens:
+                self._token_bucket.refill(time.monotonic())
+                self._token_bucket.consume(extra_tokens)
+
+
+class RateLimiterPool:
+    """按 API_URL 共享限流器，所有发送路径使用同一份预算"""
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_url):
+        """获取 api_url 对应的限流器，不存在时创建（默认不限制）"""
+        with self._lock:
+            limiter = self._limiters.get(api_url)
+            if limiter is None:
+                limiter = RateLimiter()
+                self._limiters[api_url] = limiter
+            return limiter
+
+    def configure(self, api_url, rpm, tpm):
+        """设置 api_url 的 RPM/TPM 预算"""
+        self.get(api_url).configure(rpm, tpm)
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class ResponseCache:
+    """确定性请求（温度为 0）的磁盘响应缓存：SQLite 单文件存储，zlib 压缩，按总大小做 LRU 淘汰并支持过期时间"""
+
+    def __init__(self, path="cache/response_cache.db", max_bytes=50 * 1024 * 1024, ttl_seconds=7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes  # 缓存内容（压缩后）的总大小上限
+        self.ttl_seconds = ttl_seconds  # 缓存有效期，0 表示永不过期
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def configure(self, max_bytes, ttl_seconds):
+        """更新大小上限和有效期，超出新上限的部分立即淘汰"""
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        with self._lock:
+            if self._conn is not None:
+                self._evict()
+
+    @staticmethod
+    def make_key(api_url, data):
+        """由 API 地址、模型、消息、温度和 max_tokens 计算缓存键；不可缓存的请求返回 None"""
+        # 只有温度为 0 的请求结果可重复，其余请求（包括不支持温度的推理模型）不缓存
+        if data.get("temperature") != 0:
+            return None
+        payload = json.dumps({
+            "api_url": api_url,
+            "model": data.get("model"),
+            "messages": data.get("messages"),
+            "temperature": data.get("temperature"),
+            "max_tokens": data.get("max_tokens"),
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _connect(self):
+        """首次使用时再打开数据库，未启用缓存时不创建文件"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key):
+        """读取缓存的响应（{"content", "reasoning"}），未命中或已过期时返回 None"""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    conn.commit()
+                    return None
+                # 更新访问时间，淘汰时优先删除最久未使用的条目
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                conn.commit()
+            return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            print(f"读取响应缓存失败: {str(e)}")
+            return None
+
+    def put(self, key, value):
+        """写入响应，并在超出大小上限时淘汰最久未使用的条目"""
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'), 6)
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                             (key, sqlite3.Binary(blob), len(blob), now, now))
+                self._evict()
+        except sqlite3.Error as e:
+            print(f"写入响应缓存失败: {str(e)}")
+
+    def _evict(self):
+        """删除过期条目，再按访问时间从旧到新删除，直到总大小不超过上限（调用方需持有锁）"""
+        conn = self._conn
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            expired = []
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                if total <= self.max_bytes:
+                    break
+                expired.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM responses WHERE key = ?", expired)
+        conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
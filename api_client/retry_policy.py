@@ -0,0 +1,64 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+
+# 可重试的 HTTP 状态码：超时、冲突、限流和服务端临时错误
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    """请求重试策略：指数退避 + 随机抖动，并优先遵循服务端返回的 Retry-After"""
+
+    def __init__(self, max_retries=3, backoff_base=1.0, backoff_max=60.0, jitter=0.5):
+        self.max_retries = max(0, int(max_retries))  # 首次请求之外的最大重试次数
+        self.backoff_base = max(0.0, float(backoff_base))  # 第一次重试前的基础等待秒数
+        self.backoff_max = backoff_max  # 指数退避的等待上限
+        self.jitter = min(max(0.0, float(jitter)), 1.0)  # 抖动比例，0 表示不抖动
+
+    @property
+    def max_attempts(self):
+        """包括首次请求在内的最大尝试次数"""
+        return self.max_retries + 1
+
+    def should_retry(self, error, attempt):
+        """判断第 attempt 次（从 0 开始计数）请求失败后是否应当重试"""
+        if attempt >= self.max_retries:
+            return False
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              requests.exceptions.ChunkedEncodingError)):
+            return True
+        response = getattr(error, 'response', None)
+        return response is not None and response.status_code in RETRYABLE_STATUS_CODES
+
+    def get_delay(self, attempt, error=None):
+        """计算第 attempt 次失败后的等待秒数"""
+        retry_after = self.parse_retry_after(getattr(error, 'response', None))
+        if retry_after is not None:
+            # 服务端明确给出等待时间时严格遵循，只追加少量正向抖动，避免多个客户端同时醒来
+            return retry_after + random.uniform(0, self.jitter)
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    @staticmethod
+    def parse_retry_after(response):
+        """解析 Retry-After 响应头（秒数或 HTTP 日期），没有时返回 None"""
+        if response is None:
+            return None
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        value = value.strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at is None:
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
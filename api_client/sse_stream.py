@@ -0,0 +1,80 @@
+import json
+
+
+def iter_sse_events(response, chunk_size=64):
+    """逐行解析 SSE（server-sent events）流式响应，依次产出每个 data 事件的 JSON 对象"""
+    data_lines = []
+    # chunk_size 取较小值，保证首个 token 到达后能立即被解析
+    for raw_line in response.iter_lines(chunk_size=chunk_size):
+        line = raw_line.decode('utf-8', errors='replace') if isinstance(raw_line, bytes) else raw_line
+        if not line:
+            # 空行表示一个事件结束
+            if data_lines:
+                payload = "\n".join(data_lines)
+                data_lines = []
+                if payload.strip() == "[DONE]":
+                    return
+                yield json.loads(payload)
+            continue
+        if line.startswith(":"):
+            # 注释行（服务端心跳保活），忽略
+            continue
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            data_lines.append(value)
+
+    # 处理最后一个没有以空行结尾的事件
+    if data_lines:
+        payload = "\n".join(data_lines)
+        if payload.strip() != "[DONE]":
+            yield json.loads(payload)
+
+
+class StreamAccumulator:
+    """累积流式响应中的增量内容，得到完整回复"""
+
+    def __init__(self):
+        self.content_parts = []
+        self.reasoning_parts = []
+        self.usage = None
+        self.finish_reason = None
+
+    def feed(self, event):
+        """处理一个 SSE 事件，返回 (reasoning_content 增量, content 增量)"""
+        if "error" in event:
+            error = event["error"]
+            message = error.get("message", error) if isinstance(error, dict) else error
+            raise ValueError(f"流式响应返回错误: {message}")
+
+        # 开启 include_usage 后，最后一个事件携带 usage 且 choices 为空
+        if event.get("usage"):
+            self.usage = event["usage"]
+
+        choices = event.get("choices") or []
+        if not choices:
+            return "", ""
+
+        choice = choices[0]
+        if choice.get("finish_reason"):
+            self.finish_reason = choice["finish_reason"]
+
+        delta = choice.get("delta") or {}
+        reasoning = delta.get("reasoning_content") or ""
+        content = delta.get("content") or ""
+        if reasoning:
+            self.reasoning_parts.append(reasoning)
+        if content:
+            self.content_parts.append(content)
+        return reasoning, content
+
+    @property
+    def content(self):
+        """已收到的回复正文"""
+        return "".join(self.content_parts)
+
+    @property
+    def reasoning(self):
+        """已收到的思考过程（deepseek-reasoner 的 reasoning_content）"""
+        return "".join(self.reasoning_parts)
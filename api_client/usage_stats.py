@@ -0,0 +1,48 @@
+class UsageStats:
+    """累计一次对话的 token 用量与前缀缓存命中情况"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """开始新对话时清零"""
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hit_tokens = 0
+        self.cache_miss_tokens = 0
+
+    def add(self, usage):
+        """累加一次响应中的 usage 字段"""
+        if not usage:
+            return
+        self.requests += 1
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += usage.get("completion_tokens") or 0
+
+        if "prompt_cache_hit_tokens" in usage:
+            # DeepSeek 格式
+            hit = usage.get("prompt_cache_hit_tokens") or 0
+            miss = usage.get("prompt_cache_miss_tokens") or 0
+        else:
+            # OpenAI 格式：prompt_tokens_details.cached_tokens
+            details = usage.get("prompt_tokens_details") or {}
+            hit = details.get("cached_tokens") or 0
+            miss = max(prompt_tokens - hit, 0)
+        self.cache_hit_tokens += hit
+        self.cache_miss_tokens += miss
+
+    @property
+    def hit_rate(self):
+        """前缀缓存命中率"""
+        total = self.cache_hit_tokens + self.cache_miss_tokens
+        return self.cache_hit_tokens / total if total else 0.0
+
+    def summary(self):
+        """生成用于界面显示的统计文字"""
+        if not self.requests:
+            return ""
+        return (f"本对话 {self.requests} 次请求 | 输入 {self.prompt_tokens} tokens"
+                f"（缓存命中 {self.cache_hit_tokens} / 未命中 {self.cache_miss_tokens}，命中率 {self.hit_rate:.0%}）"
+                f" | 输出 {self.completion_tokens} tokens")
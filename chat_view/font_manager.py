@@ -0,0 +1,50 @@
+import tkinter.font as tkfont
+
+
+class FontManager:
+    """按用途共享的命名字体：各控件引用同一个 tkinter.font.Font，缩放时只需修改字体对象，由 Tk 统一更新所有控件"""
+
+    # 各用途的默认字号：聊天记录（含思考面板）、输入框、回复查看窗口、历史预览
+    ROLES = {"chat": 12, "input": 12, "popup": 12, "preview": 12}
+
+    def __init__(self, root, family="Arial", min_size=6, max_size=40):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.root = root
+        self.fonts = {role: tkfont.Font(root=root, family=family, size=size) for role, size in self.ROLES.items()}
+        self.variants = {}  # {(用途, 名称): (字体, 相对字号)}，如标题、代码字体，随所属用途一起缩放
+
+    def get(self, role):
+        """获取某个用途的字体对象"""
+        return self.fonts[role]
+
+    def variant(self, role, name, scale=1.0, **options):
+        """获取某个用途的派生字体（如加粗、等宽、放大的标题），缩放该用途时一并调整"""
+        key = (role, name)
+        if key not in self.variants:
+            base = self.fonts[role].actual()
+            base.update(options)
+            base["size"] = max(round(self.size(role) * scale), 1)
+            self.variants[key] = (tkfont.Font(root=self.root, **base), scale)
+        return self.variants[key][0]
+
+    def size(self, role):
+        """某个用途的当前字号"""
+        return self.fonts[role].cget("size")
+
+    def zoom(self, role, step):
+        """将某个用途的字号增减 step，限制在允许范围内，返回新字号"""
+        size = min(max(self.size(role) + step, self.min_size), self.max_size)
+        if size != self.size(role):
+            self.fonts[role].configure(size=size)
+            for (variant_role, _), (font, scale) in self.variants.items():
+                if variant_role == role:
+                    font.configure(size=max(round(size * scale), 1))
+        return size
+
+    @staticmethod
+    def zoom_step(event):
+        """由滚轮事件得到缩放方向：Windows/macOS 看 delta，Linux 的 Button-4/5 看 num"""
+        if getattr(event, 'num', None) == 4 or getattr(event, 'delta', 0) > 0:
+            return 1
+        return -1
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+import tkinter as tk
+
+
+def date_group(mtime, now=None):
+    """按修改时间得到分组名：今天、昨天、最近7天，更早的按月份分组"""
+    now = time.localtime(now)
+    day = time.localtime(mtime)
+    today_start = time.mktime((now.tm_year, now.tm_mon, now.tm_mday, 0, 0, 0, 0, 0, -1))
+    if mtime >= today_start:
+        return "今天"
+    if mtime >= today_start - 86400:
+        return "昨天"
+    if mtime >= today_start - 6 * 86400:
+        return "最近7天"
+    return time.strftime("%Y年%m月", day)
+
+
+def item_values(metadata, mtime):
+    """列表中一个文件的标题、消息数和修改时间（元数据来自历史索引，尚未索引时留空）"""
+    modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime)) if mtime else ""
+    if not metadata:
+        return ("", "", modified)
+    return (metadata["title"], metadata["message_count"], modified)
+
+
+class HistoryList:
+    """历史文件列表：在后台线程遍历目录并按修改时间排序，Treeview 按页填充，
+    滚动接近底部时再插入下一页，文件按日期分组显示"""
+
+    def __init__(self, tree, scrollbar, post, page_size=100, on_error=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.post = post  # post(回调, *参数)：把遍历结果交回主线程
+        self.page_size = page_size
+        self.on_error = on_error  # on_error(错误信息)
+        self.entries = []  # [(文件名, 修改时间)]，按显示顺序
+        self.metadata = {}  # {文件名: 元数据}
+        self.shown = 0  # 已插入列表的条目数
+        self.grouped = True
+        self._groups = {}  # {分组名: 节点}
+        self._generation = 0  # 每次重新加载加一，丢弃过期的后台结果
+        self._fill_pending = False
+        tree.config(yscrollcommand=self._on_yscroll)
+
+    @staticmethod
+    def _iid(name):
+        return "file:" + name
+
+    def load(self, directory, metadata_provider, snapshot=None):
+        """在后台线程遍历目录，完成后从第一页开始显示；metadata_provider() 返回 {文件名: 元数据}；
+        传入目录监视得到的 snapshot（{文件名: (修改时间, 大小)}）时不再遍历目录"""
+        self._generation += 1
+        threading.Thread(target=self._scan, args=(self._generation, directory, metadata_provider, snapshot),
+                         daemon=True).start()
+
+    def _scan(self, generation, directory, metadata_provider, snapshot):
+        """工作线程：用 scandir 一次取得文件名和修改时间，按修改时间从新到旧排序"""
+        try:
+            if snapshot is not None:
+                entries = [(name, mtime) for name, (mtime, _) in snapshot.items()]
+            else:
+                with os.scandir(directory) as it:
+                    entries = [(entry.name, entry.stat().st_mtime) for entry in it
+                               if entry.name.endswith(".json") and entry.is_file()]
+            entries.sort(key=lambda item: item[1], reverse=True)
+            self.post(self._on_scanned, generation, entries, metadata_provider(), None)
+        except OSError as e:
+            self.post(self._on_scanned, generation, [], {}, str(e))
+
+    def _on_scanned(self, generation, entries, metadata, error):
+        if generation != self._generation or not self.tree.winfo_exists():
+            return
+        if error and self.on_error:
+            self.on_error(error)
+        self.set_entries(entries, metadata)
+
+    def set_entries(self, entries, metadata, grouped=True):
+        """替换列表内容（如显示搜索结果），只插入第一页"""
+        self._generation += 1  # 进行中的目录遍历结果不再覆盖当前内容
+        self.entries = list(entries)
+        self.metadata = metadata
+        self.grouped = grouped
+        self.shown = 0
+        self._groups = {}
+        self.tree.delete(*self.tree.get_children())
+        self._fill_page()
+
+    def _fill_page(self):
+        """插入下一页条目"""
+        self._fill_pending = False
+        if not self.tree.winfo_exists():
+            return
+        for name, mtime in self.entries[self.shown:self.shown + self.page_size]:
+            parent = self._group(mtime) if self.grouped else ""
+            self.tree.insert(parent, tk.END, iid=self._iid(name), text=name,
+                             values=item_values(self.metadata.get(name), mtime))
+        self.shown = min(self.shown + self.page_size, len(self.entries))
+
+    def _group(self, mtime):
+        label = date_group(mtime)
+        if label not in self._groups:
+            self._groups[label] = self.tree.insert("", tk.END, text=label, open=True)
+        return self._groups[label]
+
+    def _on_yscroll(self, first, last):
+        """滚动条回调：接近底部且还有未显示的条目时，在空闲时插入下一页"""
+        self.scrollbar.set(first, last)
+        if float(last) >= 0.95 and self.shown < len(self.entries) and not self._fill_pending:
+            self._fill_pending = True
+            self.tree.after_idle(self._fill_page)
+
+    def selected_file(self):
+        """当前选中的文件名；未选中或选中的是分组时返回 None"""
+        selection = self.tree.selection()
+        if selection and selection[0].startswith("file:"):
+            return selection[0][len("file:"):]
+        return None
+
+    def upsert(self, name, mtime, metadata):
+        """新增或更新一个文件（如其他程序写入的文件）：按修改时间插入到相应位置，位于已显示范围内时同步更新列表"""
+        self.metadata[name] = metadata
+        if not self.grouped:
+            # 搜索结果只更新已列出文件的信息
+            if self.tree.exists(self._iid(name)):
+                self.tree.item(self._iid(name), values=item_values(metadata, mtime))
+            return
+        self.remove(name)
+        position = 0
+        while position < len(self.entries) and self.entries[position][1] > mtime:
+            position += 1
+        self.entries.insert(position, (name, mtime))
+        # 插入位置之后还有未显示的条目时，留到滚动加载时再显示
+        if position > self.shown:
+            return
+        self.shown += 1
+        labels = [date_group(entry_mtime) for _, entry_mtime in self.entries[:position]]
+        label = date_group(mtime)
+        if label not in self._groups:
+            # 分组按时间顺序排列，新分组位于之前出现过的各分组之后
+            self._groups[label] = self.tree.insert("", len(set(labels)), text=label, open=True)
+        self.tree.insert(self._groups[label], labels.count(label), iid=self._iid(name), text=name,
+                         values=item_values(metadata, mtime))
+
+    def remove(self, name):
+        """从列表中删除一个文件，分组为空时一并删除"""
+        for position, (entry_name, _) in enumerate(self.entries):
+            if entry_name == name:
+                del self.entries[position]
+                if position < self.shown:
+                    self.shown -= 1
+                break
+        iid = self._iid(name)
+        if self.tree.exists(iid):
+            parent = self.tree.parent(iid)
+            self.tree.delete(iid)
+            if parent and not self.tree.get_children(parent):
+                self.tree.delete(parent)
+                self._groups = {label: node for label, node in self._groups.items() if node != parent}
@@ -0,0 +1,114 @@
+import re
+from functools import lru_cache
+
+
+# 行级语法
+HEADING_RE = re.compile(r"(#{1,6})\s+(.*)")
+RULE_RE = re.compile(r"\s*([-*_])(\s*\1){2,}\s*")
+QUOTE_RE = re.compile(r"\s*>\s?(.*)")
+LIST_RE = re.compile(r"(\s*)([-*+]|\d+[.)])\s+(.*)")
+# 行内语法：行内代码、加粗、斜体
+INLINE_RE = re.compile(r"`([^`\n]+)`|\*\*([^*\n]+)\*\*|__([^_\n]+)__|\*([^*\s][^*\n]*?)\*")
+
+
+def configure_markdown_tags(widget, fonts, role="chat"):
+    """为文本控件配置 Markdown 渲染用的标签（只需在控件创建时调用一次）"""
+    widget.tag_config("md_h1", font=fonts.variant(role, "h1", 1.5, weight="bold"), spacing1=6, spacing3=4)
+    widget.tag_config("md_h2", font=fonts.variant(role, "h2", 1.3, weight="bold"), spacing1=5, spacing3=3)
+    widget.tag_config("md_h3", font=fonts.variant(role, "h3", 1.1, weight="bold"), spacing1=4, spacing3=2)
+    widget.tag_config("md_bold", font=fonts.variant(role, "bold", weight="bold"))
+    widget.tag_config("md_italic", font=fonts.variant(role, "italic", slant="italic"))
+    widget.tag_config("md_code", font=fonts.variant(role, "code", family="Courier"), background="#eeeeee")
+    widget.tag_config("md_code_block", font=fonts.variant(role, "code", family="Courier"), background="#f5f5f5",
+                      lmargin1=12, lmargin2=12)
+    widget.tag_config("md_fence", foreground="#999999")
+    widget.tag_config("md_quote", foreground="#666666", lmargin1=16, lmargin2=16)
+    widget.tag_config("md_list", lmargin1=8, lmargin2=24)
+    widget.tag_config("md_rule", foreground="#bbbbbb")
+
+
+class MarkdownStream:
+    """按行增量解析 Markdown：已完整的行渲染后不再变化，只有末尾未完成的一行在每次追加时重新解析"""
+
+    def __init__(self):
+        self.in_code = False  # 是否位于 ``` 代码块内
+        self.partial = ""  # 末尾尚未换行的文本
+
+    def feed(self, text):
+        """追加文本，返回 (新完成各行的渲染片段, 末尾未完成行的临时渲染片段)"""
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        runs = []
+        for line in lines:
+            runs.extend(self.render_line(line, "\n"))
+        return runs, self.render_line(self.partial, "", commit=False)
+
+    def finish(self):
+        """消息结束，返回末尾一行的最终渲染片段"""
+        runs = self.render_line(self.partial, "") if self.partial else []
+        self.partial = ""
+        return runs
+
+    def render_line(self, line, newline, commit=True):
+        """渲染一行，返回 [(文本, 标签元组)]；commit 为 False 时不改变代码块状态（用于临时渲染）"""
+        if not line and not newline:
+            return []
+        if line.lstrip().startswith("```"):
+            if commit:
+                self.in_code = not self.in_code
+            return [(line + newline, ("md_fence",))]
+        if self.in_code:
+            return [(line + newline, ("md_code_block",))]
+
+        match = HEADING_RE.match(line)
+        if match:
+            level = min(len(match.group(1)), 3)
+            return render_inline(match.group(2), (f"md_h{level}",)) + [(newline, ())]
+        if RULE_RE.fullmatch(line):
+            return [("─" * 30 + newline, ("md_rule",))]
+        match = QUOTE_RE.match(line)
+        if match:
+            return render_inline(match.group(1), ("md_quote",)) + [(newline, ())]
+        match = LIST_RE.match(line)
+        if match:
+            indent, marker, content = match.groups()
+            bullet = "•" if marker in "-*+" else marker
+            return [(indent + bullet + " ", ("md_list",))] + render_inline(content, ("md_list",)) + [(newline, ())]
+        return render_inline(line, ()) + [(newline, ())]
+
+
+def render_inline(text, base_tags):
+    """渲染行内的代码、加粗和斜体，去掉标记符号"""
+    runs = []
+    position = 0
+    for match in INLINE_RE.finditer(text):
+        if match.start() > position:
+            runs.append((text[position:match.start()], base_tags))
+        code, bold, bold_alt, italic = match.groups()
+        if code is not None:
+            runs.append((code, base_tags + ("md_code",)))
+        elif italic is not None:
+            runs.append((italic, base_tags + ("md_italic",)))
+        else:
+            runs.append((bold if bold is not None else bold_alt, base_tags + ("md_bold",)))
+        position = match.end()
+    if position < len(text):
+        runs.append((text[position:], base_tags))
+    return runs
+
+
+@lru_cache(maxsize=512)
+def render_markdown(text):
+    """渲染完整的消息，返回合并后的 ((文本, 标签元组), ...)；结果按内容缓存，重新加载或重新显示同一消息时无需再次解析"""
+    stream = MarkdownStream()
+    runs, _ = stream.feed(text)
+    runs.extend(stream.finish())
+    merged = []  # [[文本片段列表, 标签元组]]，最后统一拼接，避免长代码块逐行拼接字符串
+    for run_text, tags in runs:
+        if not run_text:
+            continue
+        if merged and merged[-1][1] == tags:
+            merged[-1][0].append(run_text)
+        else:
+            merged.append([[run_text], tags])
+    return tuple(("".join(parts), tags) for parts, tags in merged)
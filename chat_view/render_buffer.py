@@ -0,0 +1,120 @@
+import tkinter as tk
+
+
+# 临时尾部（如流式回复中尚未完成的一行）开头的标记
+TAIL_MARK = "render_tail"
+
+
+class RenderBuffer:
+    """文本控件的渲染缓冲：收集待插入的文本片段及其标签，每帧最多向控件写入一次"""
+
+    def __init__(self, widget, interval_ms=20):
+        self.widget = widget
+        self.interval_ms = interval_ms  # 两次写入控件的最短间隔（约 50 Hz）
+        self._runs = []  # [[文本, 标签元组], ...]，相邻且标签相同的片段合并；文本为 None 时表示标记 [None, 标记名]
+        self._tail = []  # 临时尾部 [(文本, 标签元组)]，始终显示在末尾，每次写入时整体替换
+        self._tail_dirty = False
+        self._tail_shown = False  # 控件中是否有临时尾部
+        self._after_id = None
+        self._force_scroll = False
+
+    def _schedule(self):
+        if self._after_id is None:
+            self._after_id = self.widget.after(self.interval_ms, self.flush)
+
+    def write(self, text, tags=()):
+        """追加一段文本，在下一帧统一写入控件"""
+        if not text:
+            return
+        if isinstance(tags, str):
+            tags = (tags,)
+        else:
+            tags = tuple(tags)
+        if self._runs and self._runs[-1][0] is not None and self._runs[-1][1] == tags:
+            self._runs[-1][0] += text
+        else:
+            self._runs.append([text, tags])
+        self._schedule()
+
+    def mark(self, name):
+        """在当前缓冲位置设置 Tk 标记，写入控件时按行列换算出实际位置"""
+        self._runs.append([None, name])
+        self._schedule()
+
+    def set_tail(self, runs):
+        """设置临时尾部 [(文本, 标签元组)]：显示在所有已写入内容之后，下次设置时被替换"""
+        self._tail = list(runs or [])
+        self._tail_dirty = True
+        self._schedule()
+
+    def drop_tail(self):
+        """控件中的临时尾部已随其他内容被删除时，清除尾部状态"""
+        if self._tail_shown:
+            self.widget.mark_unset(TAIL_MARK)
+        self._tail = []
+        self._tail_dirty = False
+        self._tail_shown = False
+
+    def scroll_to_end(self):
+        """下次写入后无论当前位置都滚动到底部（如用户自己发送消息时）"""
+        self._force_scroll = True
+        self._schedule()
+
+    def at_bottom(self):
+        """视图是否停留在底部"""
+        return self.widget.yview()[1] >= 0.999
+
+    def flush(self):
+        """将缓冲的片段一次性插入控件；只有原本就停留在底部时才自动滚动"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        runs, self._runs = self._runs, []
+        follow = self._force_scroll or self.at_bottom()
+        self._force_scroll = False
+        if runs or self._tail_dirty:
+            self.widget.config(state='normal')
+            # 临时尾部必须位于最后：先删除旧尾部，与新内容一起重新插入
+            if self._tail_shown:
+                self.widget.delete(TAIL_MARK, "end-1c")
+                self.widget.mark_unset(TAIL_MARK)
+                self._tail_shown = False
+            # Text.insert 支持一次传入多组 (文本, 标签)，整批只触发一次重排；
+            # 标记位置由插入起点加上之前文本的行数和列数推算，不必逐段插入
+            line, col = map(int, self.widget.index("end-1c").split("."))
+            args, marks = [], []
+            for text, tags in runs + [[None, TAIL_MARK]] + self._tail:
+                if text is None:
+                    marks.append((tags, f"{line}.{col}"))
+                    continue
+                args.extend((text, tags))
+                newlines = text.count("\n")
+                if newlines:
+                    line += newlines
+                    col = len(text) - text.rfind("\n") - 1
+                else:
+                    col += len(text)
+            if args:
+                self.widget.insert(tk.END, *args)
+            self.widget.config(state='disabled')
+            for name, index in marks:
+                if name == TAIL_MARK and not self._tail:
+                    continue
+                self.widget.mark_set(name, index)
+                # 左侧重力：在标记处追加的文本位于标记之后，标记始终指向消息开头
+                self.widget.mark_gravity(name, tk.LEFT)
+            self._tail_shown = bool(self._tail)
+            self._tail_dirty = False
+        if follow:
+            self.widget.yview_moveto(1.0)
+
+    def clear(self):
+        """丢弃未写入的片段并清空控件"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._runs = []
+        self.drop_tail()
+        self.widget.config(state='normal')
+        self.widget.delete("1.0", tk.END)
+        self.widget.config(state='disabled')
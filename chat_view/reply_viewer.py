@@ -0,0 +1,186 @@
+import time
+import tkinter as tk
+import tkinter.font as tkfont
+from collections import deque
+from tkinter import ttk
+
+
+class ReplyViewer:
+    """可复用的回复查看窗口：窗口和文本框只创建一次，之后原地替换内容，可通过下拉框查看最近的回复"""
+
+    def __init__(self, manager, title):
+        self.manager = manager
+        self.title = title
+        self.message = ""
+        self._resize_after_id = None
+        self._font = None  # 文本框字体不是命名字体时缓存的字体对象
+        self._font_spec = None
+        self.window = tk.Toplevel(manager.root)
+        self.window.title(title)
+        self.window.geometry("600x400")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        # 创建主容器
+        main_frame = tk.Frame(self.window)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        main_frame.grid_rowconfigure(1, weight=1)
+        main_frame.grid_columnconfigure(0, weight=1)
+
+        # 最近回复下拉框
+        self.history_var = tk.StringVar()
+        self.history_menu = ttk.Combobox(main_frame, textvariable=self.history_var, state="readonly")
+        self.history_menu.grid(row=0, column=0, sticky='ew', pady=(0, 5))
+        self.history_menu.bind("<<ComboboxSelected>>", self.on_history_selected)
+
+        # 创建文本容器
+        text_container = tk.Frame(main_frame)
+        text_container.grid(row=1, column=0, sticky='nsew')
+        text_container.grid_rowconfigure(0, weight=1)
+        text_container.grid_columnconfigure(0, weight=1)
+        self.text_container = text_container
+
+        # 创建文本框
+        self.text_box = tk.Text(
+            text_container,
+            wrap=tk.WORD,
+            font=('Arial', 12),
+            width=80,  # Initial width in characters
+            height=20  # Initial height in lines
+        )
+        self.text_box.config(state='disabled')
+
+        # 添加垂直滚动条
+        v_scroll = ttk.Scrollbar(text_container, orient=tk.VERTICAL, command=self.text_box.yview)
+        self.text_box.config(yscrollcommand=v_scroll.set)
+        self.text_box.grid(row=0, column=0, sticky='nsew')
+        v_scroll.grid(row=0, column=1, sticky='ns')
+        self.v_scroll = v_scroll
+
+        # 创建按钮容器
+        button_frame = tk.Frame(main_frame)
+        button_frame.grid(row=2, column=0, sticky='ew', pady=(10, 0))
+        button_frame.grid_columnconfigure(0, weight=1)
+        button_frame.grid_columnconfigure(1, weight=1)
+
+        # 复制、保存按钮始终作用于当前显示的内容
+        tk.Button(button_frame, text="复制", command=lambda: manager.on_copy(self.message), width=10).grid(row=0, column=0, padx=5)
+        tk.Button(button_frame, text="保存", command=lambda: manager.on_save(self.message), width=10).grid(row=0, column=1, padx=5)
+
+        # 允许窗口大小调整；<Configure> 会冒泡到所有子控件，只处理窗口本身的事件
+        self.window.resizable(True, True)
+        self.window.bind('<Configure>', self.on_configure)
+        if manager.on_create:
+            manager.on_create(self)
+
+    def on_configure(self, event):
+        """窗口大小变化：拖动过程中只重置计时器，停止变化一段时间后再调整一次文本框"""
+        if event.widget is not self.window:
+            return
+        if self._resize_after_id is not None:
+            self.window.after_cancel(self._resize_after_id)
+        self._resize_after_id = self.window.after(self.manager.resize_delay_ms, self.apply_resize)
+
+    def apply_resize(self):
+        """按字体度量把文本区域的像素尺寸换算为字符数和行数，仅在变化时更新文本框"""
+        self._resize_after_id = None
+        if not self.text_box.winfo_exists():
+            return
+        font = self._text_font()
+        char_width = max(font.measure("0"), 1)
+        line_height = max(font.metrics("linespace"), 1)
+        # 文本容器已由 grid 分配好实际大小，直接读取，不强制重新布局
+        available_width = self.text_container.winfo_width() - self.v_scroll.winfo_width()
+        available_height = self.text_container.winfo_height()
+        width = max(available_width // char_width, 1)
+        height = max(available_height // line_height, 1)
+        if (width, height) != (int(self.text_box.cget("width")), int(self.text_box.cget("height"))):
+            self.text_box.config(width=width, height=height)
+
+    def _text_font(self):
+        """文本框的字体：命名字体直接取用，字体描述只在变化时创建一次字体对象，避免每次调整都新建 Tcl 字体"""
+        spec = self.text_box.cget("font")
+        try:
+            return tkfont.nametofont(spec)
+        except tk.TclError:
+            if spec != self._font_spec:
+                self._font = tkfont.Font(root=self.window, font=spec)
+                self._font_spec = spec
+            return self._font
+
+    def show(self, message):
+        """原地替换显示内容"""
+        self.message = message
+        self.text_box.config(state='normal')
+        self.text_box.delete("1.0", tk.END)
+        self.text_box.insert(tk.END, message)
+        self.text_box.config(state='disabled')
+        self.text_box.yview_moveto(0.0)
+
+    def refresh_history(self):
+        """刷新下拉框中的最近回复列表（最新的在前）"""
+        self.history_menu.config(values=[label for label, _ in self.manager.history_items(self.title)])
+        if self.history_menu.cget("values"):
+            self.history_menu.current(0)
+
+    def on_history_selected(self, event=None):
+        """切换到下拉框中选中的回复"""
+        items = self.manager.history_items(self.title)
+        index = self.history_menu.current()
+        if 0 <= index < len(items):
+            self.show(items[index][1])
+
+    def close(self):
+        """关闭窗口"""
+        if self._resize_after_id is not None:
+            self.window.after_cancel(self._resize_after_id)
+        self.manager.viewers.pop(self.title, None)
+        self.window.destroy()
+
+
+class ReplyViewerManager:
+    """管理回复查看窗口：每种标题（如“最新回复”“最新think”）复用一个窗口，同时打开的窗口数有上限，0 表示不弹出"""
+
+    def __init__(self, root, max_viewers=2, history_size=20, on_copy=None, on_save=None, on_create=None,
+                 resize_delay_ms=150):
+        self.root = root
+        self.max_viewers = max_viewers
+        self.resize_delay_ms = resize_delay_ms  # 窗口停止变化多久后再调整文本框
+        self.on_copy = on_copy  # on_copy(文本)
+        self.on_save = on_save  # on_save(文本)
+        self.on_create = on_create  # on_create(viewer)，窗口创建后用于绑定缩放等事件
+        self.viewers = {}  # {标题: ReplyViewer}，按最近使用排序
+        self.history = deque(maxlen=history_size)  # [(时间, 标题, 文本)]，只保存最近的若干条
+
+    def show(self, message, title="最新回复"):
+        """显示一条回复：已有同标题窗口时原地更新，否则新建（超出上限时关闭最久未用的窗口）"""
+        if self.max_viewers <= 0:
+            return
+        self.history.append((time.strftime("%H:%M:%S"), title, message))
+        viewer = self.viewers.pop(title, None)
+        if viewer is None or not viewer.window.winfo_exists():
+            while len(self.viewers) >= self.max_viewers:
+                oldest = next(iter(self.viewers.values()))
+                oldest.close()
+            viewer = ReplyViewer(self, title)
+        self.viewers[title] = viewer
+        viewer.show(message)
+        viewer.refresh_history()
+        viewer.window.deiconify()
+        viewer.window.lift()
+
+    def history_items(self, title):
+        """返回某种标题的最近回复 [(下拉框标签, 文本)]，最新的在前"""
+        items = []
+        for timestamp, item_title, message in reversed(self.history):
+            if item_title == title:
+                preview = " ".join(message[:200].split())[:30]
+                items.append((f"{timestamp}  {preview}", message))
+        return items
+
+    def configure(self, max_viewers):
+        """修改窗口上限，超出的窗口立即关闭；0 表示关闭弹窗功能"""
+        self.max_viewers = max_viewers
+        while len(self.viewers) > max(max_viewers, 0):
+            next(iter(self.viewers.values())).close()
+        if max_viewers <= 0:
+            self.history.clear()
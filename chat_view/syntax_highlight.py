@@ -0,0 +1,210 @@
+import hashlib
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# 高亮标签及颜色
+TAG_COLORS = {
+    "hl_keyword": "#0000cc",
+    "hl_builtin": "#7a3e9d",
+    "hl_string": "#067d17",
+    "hl_comment": "#8c8c8c",
+    "hl_number": "#1750eb",
+    "hl_decorator": "#9e880d",
+}
+# 已完成高亮的代码块范围
+DONE_TAG = "hl_done"
+
+
+def _words(text):
+    return r"\b(?:" + "|".join(text.split()) + r")\b"
+
+
+_C_STRING = r"\"(?:[^\"\\\n]|\\.)*\"|'(?:[^'\\\n]|\\.)*'"
+_C_COMMENT = r"//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)"
+_NUMBER = r"\b(?:0[xX][0-9a-fA-F_]+|\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?)\b"
+_C_KEYWORDS = ("if else for while do switch case default break continue return goto struct union enum typedef "
+               "const static extern volatile sizeof void int char short long float double signed unsigned bool "
+               "true false null NULL nullptr class public private protected new delete this virtual override "
+               "namespace using template typename try catch throw final abstract interface extends implements "
+               "package import var let func fn go defer chan map range type impl trait mut pub use mod match "
+               "self Self async await yield")
+
+# 各语言的规则 [(标签, 正则)]，按顺序组合为一个正则，先出现的规则优先（如字符串中的 # 不算注释）；
+# 正则以 MULTILINE 编译，未闭合的多行字符串、注释要延续到代码末尾须用 \Z 而不是 $
+LANGUAGE_RULES = {
+    "python": [
+        ("hl_comment", r"#[^\n]*"),
+        ("hl_string", r"[rRbBuUfF]{0,2}(?:\"\"\"[\s\S]*?(?:\"\"\"|\Z)|'''[\s\S]*?(?:'''|\Z)|" + _C_STRING + ")"),
+        ("hl_decorator", r"^\s*@[\w.]+"),
+        ("hl_keyword", _words("False None True and as assert async await break class continue def del elif else "
+                              "except finally for from global if import in is lambda nonlocal not or pass raise "
+                              "return try while with yield match case")),
+        ("hl_builtin", _words("print len range open int str float list dict set tuple bool type isinstance "
+                              "super object enumerate zip map filter sorted min max sum any all self cls")),
+        ("hl_number", _NUMBER),
+    ],
+    "javascript": [
+        ("hl_comment", _C_COMMENT),
+        ("hl_string", _C_STRING + r"|`(?:[^`\\]|\\.)*`"),
+        ("hl_keyword", _words("break case catch class const continue debugger default delete do else export "
+                              "extends finally for function if import in instanceof let new return super switch "
+                              "this throw try typeof var void while with yield async await of true false null "
+                              "undefined interface type enum implements private public protected readonly")),
+        ("hl_builtin", _words("console window document Array Object String Number Boolean Promise Math JSON "
+                              "Map Set Error require module exports")),
+        ("hl_number", _NUMBER),
+    ],
+    "c": [
+        ("hl_comment", _C_COMMENT),
+        ("hl_string", _C_STRING),
+        ("hl_decorator", r"^\s*#\s*\w+|@\w+"),
+        ("hl_keyword", _words(_C_KEYWORDS)),
+        ("hl_number", _NUMBER),
+    ],
+    "shell": [
+        ("hl_comment", r"(?:^|(?<=\s))#[^\n]*"),
+        ("hl_string", r"\"(?:[^\"\\]|\\.)*\"|'[^']*'"),
+        ("hl_keyword", _words("if then else elif fi for in do done while until case esac function return "
+                              "local export")),
+        ("hl_builtin", _words("echo cd ls cat grep sed awk pip python git sudo apt rm cp mv mkdir chmod curl")),
+        ("hl_decorator", r"\$\{?\w+\}?"),
+    ],
+    "sql": [
+        ("hl_comment", r"--[^\n]*|/\*[\s\S]*?(?:\*/|\Z)"),
+        ("hl_string", r"'(?:[^']|'')*'"),
+        ("hl_keyword", "(?i:" + _words("select from where and or not insert into values update set delete create "
+                                        "table drop alter index join left right inner outer on group by order "
+                                        "having limit offset as distinct union all null is in like between "
+                                        "primary key foreign references default exists case when then else end") + ")"),
+        ("hl_number", _NUMBER),
+    ],
+    "json": [
+        ("hl_builtin", r"\"(?:[^\"\\\n]|\\.)*\"(?=\s*:)"),
+        ("hl_string", r"\"(?:[^\"\\\n]|\\.)*\""),
+        ("hl_keyword", _words("true false null")),
+        ("hl_number", r"-?" + _NUMBER),
+    ],
+}
+# 语言别名；未识别的语言使用 C 风格的通用规则
+LANGUAGE_ALIASES = {
+    "py": "python", "python3": "python", "js": "javascript", "ts": "javascript", "typescript": "javascript",
+    "jsx": "javascript", "tsx": "javascript", "sh": "shell", "bash": "shell", "zsh": "shell", "console": "shell",
+}
+
+_compiled = {}
+
+
+def _pattern(language):
+    """组合某种语言的全部规则，按需编译一次"""
+    language = LANGUAGE_ALIASES.get(language, language)
+    if language not in LANGUAGE_RULES:
+        language = "c"
+    if language not in _compiled:
+        parts = [f"(?P<g{index}_{tag}>{rule})" for index, (tag, rule) in enumerate(LANGUAGE_RULES[language])]
+        _compiled[language] = re.compile("|".join(parts), re.MULTILINE)
+    return _compiled[language]
+
+
+def tokenize(language, code):
+    """切分代码，返回 {标签: [(起始偏移, 结束偏移), ...]}（纯函数，可在工作线程中执行）"""
+    ranges = {}
+    for match in _pattern(language.lower()).finditer(code):
+        if match.end() > match.start():
+            tag = match.lastgroup.split("_", 1)[1]
+            ranges.setdefault(tag, []).append((match.start(), match.end()))
+    return ranges
+
+
+def configure_syntax_tags(widget):
+    """为文本控件配置高亮标签（只需在控件创建时调用一次）"""
+    for tag, color in TAG_COLORS.items():
+        widget.tag_config(tag, foreground=color)
+
+
+class SyntaxHighlighter:
+    """代码块语法高亮：只处理视口中的 md_code_block 范围，切分在线程池中进行，
+    主线程只按结果添加标签；结果按 (语言, 代码哈希) 缓存，消息换出后再换入时直接复用"""
+
+    def __init__(self, widget, post, delay_ms=100, cache_size=256):
+        self.widget = widget
+        self.post = post  # post(回调, *参数)：把切分结果交回主线程
+        self.delay_ms = delay_ms  # 视图停止变化多久后再检查（流式输出时不必每帧检查）
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # {(语言, 哈希): 切分结果}，按最近使用排序
+        self._pending = set()  # 正在切分的键
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="highlight")
+        self._after_id = None
+        configure_syntax_tags(widget)
+
+    def schedule(self, *args):
+        """视图变化后延迟检查；连续变化时只检查一次"""
+        if self._after_id is None:
+            self._after_id = self.widget.after(self.delay_ms, self.highlight_visible)
+
+    def highlight_visible(self):
+        """为视口中尚未高亮的代码块添加标签：有缓存时直接应用，否则交给线程池切分"""
+        self._after_id = None
+        if not self.widget.winfo_exists():
+            return
+        top = self.widget.index("@0,0 linestart")
+        bottom = self.widget.index(f"@0,{self.widget.winfo_height()} lineend")
+        # 与视口相交的第一个代码块可能从视口上方开始
+        block = self.widget.tag_prevrange("md_code_block", top)
+        if not block or self.widget.compare(block[1], "<=", top):
+            block = self.widget.tag_nextrange("md_code_block", top, bottom)
+        while block:
+            start, end = block
+            # 只处理已闭合（其后紧跟 ``` 围栏行）的代码块，流式输出中的代码块闭合后再一次性高亮
+            if "md_fence" in self.widget.tag_names(end) and not self._is_done(start, end):
+                self._highlight_block(start, end)
+            block = self.widget.tag_nextrange("md_code_block", end, bottom)
+
+    def _is_done(self, start, end):
+        done = self.widget.tag_nextrange(DONE_TAG, start, end)
+        return bool(done) and self.widget.compare(done[0], "==", start) and self.widget.compare(done[1], ">=", end)
+
+    def _highlight_block(self, start, end):
+        # 代码块上一行是 ```语言 开头的围栏行
+        fence = self.widget.get(f"{start} -1 line linestart", f"{start} -1 line lineend")
+        language = fence.strip().lstrip("`").strip().split(" ")[0]
+        code = self.widget.get(start, end)
+        key = (language.lower(), hashlib.sha1(code.encode("utf-8")).hexdigest())
+        ranges = self.cache.get(key)
+        if ranges is not None:
+            self.cache.move_to_end(key)
+            self._apply(start, end, ranges)
+        elif key not in self._pending:
+            self._pending.add(key)
+            future = self._executor.submit(tokenize, language, code)
+            future.add_done_callback(lambda f: self.post(self._on_tokenized, key, f))
+
+    def _on_tokenized(self, key, future):
+        """主线程：保存切分结果，再次检查视口（代码块的位置可能已因换入换出而变化）"""
+        self._pending.discard(key)
+        if future.exception() is not None:
+            return
+        self.cache[key] = future.result()
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        if self.widget.winfo_exists():
+            self.highlight_visible()
+
+    def _apply(self, start, end, ranges):
+        """按字符偏移添加标签：每种标签一次 tag_add 调用传入全部范围"""
+        for tag in TAG_COLORS:
+            self.widget.tag_remove(tag, start, end)
+        for tag, spans in ranges.items():
+            indexes = []
+            for span_start, span_end in spans:
+                indexes.extend((f"{start}+{span_start}c", f"{start}+{span_end}c"))
+            self.widget.tag_add(tag, *indexes)
+        self.widget.tag_add(DONE_TAG, start, end)
+
+    def close(self):
+        """窗口关闭时停止线程池"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,339 @@
+import tkinter as tk
+
+from chat_view.markdown_render import MarkdownStream, render_markdown
+from chat_view.render_buffer import RenderBuffer
+
+
+class ChatTranscript:
+    """虚拟化的聊天记录显示：控件中只保留视口附近的一段消息，滚动到边缘时从内存中换入换出，
+    每条消息开头设置一个 Tk 标记，撤回、重新生成时只删除受影响的范围；AI 回复按 Markdown 渲染"""
+
+    def __init__(self, widget, max_chars=300000, page_messages=20, on_view_change=None):
+        self.widget = widget
+        self.on_view_change = on_view_change  # 视图或内容变化后的回调（如对视口中的代码块做语法高亮）
+        self.buffer = RenderBuffer(widget)
+        self.max_chars = max_chars  # 控件中保留的字符数上限（至少保留一条消息）
+        self.page_messages = page_messages  # 每次换入的消息条数
+        # 全部消息：{"id", "sender", "chunks": 文本片段列表, "history_index", "closed", "size", "markdown"}；
+        # history_index 为对应的对话历史下标，系统提示等不在历史中的消息为 None
+        self.entries = []
+        self.lo = self.hi = 0  # 控件中显示的是 entries[lo:hi]
+        self.window_chars = 0  # 控件中消息的字符总数
+        self._counter = 0
+        self._check_pending = False
+        self._stream = None  # 显示中的未结束 Markdown 消息的增量解析状态
+        self._open = None  # 流式输出中尚未结束的消息
+        self._deferred = []  # 流式输出期间写入的完整消息，待当前消息结束后再追加 [(发送者, 正文, 下标, 是否 Markdown)]
+        # 接管滚动条回调：视图变化后检查是否需要换入换出
+        self.scrollbar = getattr(widget, 'vbar', None)
+        widget.config(yscrollcommand=self._on_yscroll)
+
+    @staticmethod
+    def _mark(entry):
+        return f"msg{entry['id']}"
+
+    @staticmethod
+    def _text(entry):
+        """消息正文（流式追加的片段在此合并）"""
+        chunks = entry["chunks"]
+        if len(chunks) > 1:
+            chunks[:] = ["".join(chunks)]
+        return chunks[0] if chunks else ""
+
+    def _new_entry(self, sender, history_index, markdown):
+        entry = {"id": self._counter, "sender": sender, "chunks": [], "history_index": history_index,
+                 "closed": False, "size": len(sender) + 2, "markdown": markdown}
+        self._counter += 1
+        tail_shown = self.hi == len(self.entries)
+        self.entries.append(entry)
+        # 末尾不在显示范围内（用户正在查看更早的内容）时只记录在内存中，滚动到末尾时再换入
+        if tail_shown:
+            self.buffer.mark(self._mark(entry))
+            self.buffer.write(sender + ": ", 'red')
+            self.hi += 1
+            self.window_chars += entry["size"]
+        return entry
+
+    def _shown(self, entry):
+        """消息是否在控件中显示（新消息只会出现在末尾）"""
+        return self.hi == len(self.entries) and bool(self.entries) and self.entries[-1] is entry
+
+    @property
+    def streaming(self):
+        """是否有流式输出中尚未结束的消息"""
+        return self._open is not None
+
+    def begin_message(self, sender, history_index=None, markdown=False):
+        """开始一条流式输出的消息：设置开头标记并写入发送者；markdown 为 True 时正文按 Markdown 渲染"""
+        if self._open is not None:
+            self.end_message()
+        self._open = self._new_entry(sender, history_index, markdown)
+        if markdown and self._shown(self._open):
+            self._stream = MarkdownStream()
+
+    def append(self, text):
+        """向流式输出中的消息追加文本；Markdown 消息只解析新完成的行，未完成的一行作为临时尾部显示"""
+        entry = self._open
+        if entry is None:
+            return
+        entry["chunks"].append(text)
+        entry["size"] += len(text)
+        if self._shown(entry):
+            if self._stream is not None:
+                runs, tail = self._stream.feed(text)
+                self._write_runs(runs)
+                self.buffer.set_tail(tail)
+            else:
+                self.buffer.write(text)
+            self.window_chars += len(text)
+
+    def end_message(self):
+        """结束流式输出中的消息，再写入期间推迟的完整消息"""
+        entry = self._open
+        if entry is None:
+            return
+        self._open = None
+        entry["closed"] = True
+        entry["size"] += 2
+        if self._shown(entry):
+            if self._stream is not None:
+                self._write_runs(self._stream.finish())
+                self.buffer.set_tail(None)
+                self._stream = None
+            self.buffer.write("\n\n")
+            self.window_chars += 2
+        deferred, self._deferred = self._deferred, []
+        for args in deferred:
+            self.add_message(*args)
+
+    def add_message(self, sender, message, history_index=None, markdown=False):
+        """写入一条完整的消息；Markdown 消息直接使用按内容缓存的渲染结果。
+        有流式输出中的消息时推迟到该消息结束后再写入，不打断其解析状态"""
+        if self._open is not None:
+            self._deferred.append((sender, message, history_index, markdown))
+            return
+        entry = self._new_entry(sender, history_index, markdown)
+        entry["chunks"].append(message)
+        entry["closed"] = True
+        entry["size"] += len(message) + 2
+        if self._shown(entry):
+            if markdown:
+                self._write_runs(render_markdown(message))
+            else:
+                self.buffer.write(message)
+            self.buffer.write("\n\n")
+            self.window_chars += len(message) + 2
+
+    def _write_runs(self, runs):
+        for text, tags in runs:
+            self.buffer.write(text, tags)
+
+    def load(self, messages):
+        """批量替换全部消息（加载历史对话）：一次性建立索引，只把最后一页消息一次插入控件"""
+        # messages 为 [(发送者, 正文, 对话历史下标, 是否按 Markdown 渲染)]；不在视口附近的消息不做任何控件操作
+        self.clear()
+        for sender, message, history_index, markdown in messages:
+            self.entries.append({"id": self._counter, "sender": sender, "chunks": [message],
+                                 "history_index": history_index, "closed": True,
+                                 "size": len(sender) + len(message) + 4, "markdown": markdown})
+            self._counter += 1
+        if self.entries:
+            self._show_tail()
+
+    def truncate(self, history_index):
+        """删除对话历史下标不小于 history_index 的第一条消息及其后的全部消息，没有对应消息时返回 False"""
+        for position, entry in enumerate(self.entries):
+            if entry["history_index"] is not None and entry["history_index"] >= history_index:
+                break
+        else:
+            return False
+        # 先写入缓冲中的内容，保证标记已就位
+        self.buffer.flush()
+        if position < self.hi:
+            start = max(position, self.lo)
+            self.widget.config(state='normal')
+            self.widget.delete(self._mark(self.entries[start]), tk.END)
+            self.widget.config(state='disabled')
+            for entry in self.entries[start:self.hi]:
+                self.widget.mark_unset(self._mark(entry))
+                self.window_chars -= entry["size"]
+            if self.hi == len(self.entries):
+                self._drop_stream()
+            self.hi = start
+            self.lo = min(self.lo, self.hi)
+        if self._open is not None and self._open in self.entries[position:]:
+            self._open = None
+            self._deferred = []
+        del self.entries[position:]
+        # 显示范围被整体删除时，改为显示末尾的消息
+        if self.lo == self.hi and self.entries:
+            self._show_tail()
+        return True
+
+    def shift_history_indexes(self, start, delta):
+        """对话历史在 start 处插入或删除了消息：对话历史下标不小于 start 的消息的下标加上 delta"""
+        for entry in self.entries:
+            if entry["history_index"] is not None and entry["history_index"] >= start:
+                entry["history_index"] += delta
+        self._deferred = [(sender, message, index + delta if index is not None and index >= start else index, markdown)
+                          for sender, message, index, markdown in self._deferred]
+
+    def clear(self):
+        """清空全部消息"""
+        self.buffer.clear()
+        self._stream = None
+        self._open = None
+        self._deferred = []
+        for entry in self.entries[self.lo:self.hi]:
+            self.widget.mark_unset(self._mark(entry))
+        self.entries = []
+        self.lo = self.hi = 0
+        self.window_chars = 0
+
+    def scroll_to_end(self):
+        """下次写入后滚动到底部；末尾不在显示范围内时先换入末尾的消息"""
+        if self.hi < len(self.entries):
+            self.buffer.clear()
+            self._stream = None
+            for entry in self.entries[self.lo:self.hi]:
+                self.widget.mark_unset(self._mark(entry))
+            self.window_chars = 0
+            self._show_tail()
+        self.buffer.scroll_to_end()
+
+    def _show_tail(self):
+        """在空的控件中换入最后一页消息并滚动到底部"""
+        # 从末尾向前取一页，同时不超过字符上限（至少一条），超长对话也只插入视口附近的内容
+        self.hi = len(self.entries)
+        self.lo, chars = self.hi, 0
+        while self.lo > 0 and self.hi - self.lo < self.page_messages:
+            chars += self.entries[self.lo - 1]["size"]
+            if chars > self.max_chars and self.lo < self.hi:
+                break
+            self.lo -= 1
+        self._insert("1.0", self.entries[self.lo:self.hi])
+        self.widget.yview_moveto(1.0)
+        self._shrink("top")
+
+    def _on_yscroll(self, first, last):
+        """视图变化回调：更新滚动条，并在空闲时检查是否需要换入换出"""
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if self.on_view_change is not None:
+            self.on_view_change()
+        if not self._check_pending:
+            self._check_pending = True
+            self.widget.after_idle(self._check_viewport)
+
+    def _check_viewport(self):
+        """视口接近顶部或底部时换入相邻的消息，超出字符上限时换出视口外的消息"""
+        self._check_pending = False
+        if not self.widget.winfo_exists():
+            return
+        first, last = self.widget.yview()
+        if first <= 0.1 and self.lo > 0:
+            self._page_up()
+        elif last >= 0.9 and self.hi < len(self.entries):
+            self._page_down()
+        elif self.window_chars > self.max_chars:
+            # 从离视口较远的一侧换出
+            self._shrink("top" if 1 - last < first else "bottom")
+
+    def _insert(self, index, entries):
+        """在 index（行首）处一次性插入若干条消息并设置标记，返回插入的行数"""
+        line = int(self.widget.index(index).split(".")[0])
+        args, marks, lines, tail = [], [], 0, None
+        for entry in entries:
+            text = self._text(entry)
+            args.extend((entry["sender"] + ": ", ('red',)))
+            if not entry["markdown"]:
+                args.extend((text, ()))
+            elif entry["closed"]:
+                # 渲染结果按内容缓存，来回滚动换入同一消息时不再重复解析
+                for run_text, tags in render_markdown(text):
+                    args.extend((run_text, tags))
+            else:
+                # 仍在流式接收的消息：重建增量解析状态，未完成的一行交给渲染缓冲作为临时尾部
+                self._stream = MarkdownStream()
+                runs, tail = self._stream.feed(text)
+                for run_text, tags in runs:
+                    args.extend((run_text, tags))
+            if entry["closed"]:
+                args.extend(("\n\n", ()))
+            marks.append((self._mark(entry), f"{line + lines}.0"))
+            lines += text.count("\n") + (2 if entry["closed"] else 0)
+            self.window_chars += entry["size"]
+        self.widget.config(state='normal')
+        self.widget.insert(index, *args)
+        self.widget.config(state='disabled')
+        for name, mark_index in marks:
+            self.widget.mark_set(name, mark_index)
+            self.widget.mark_gravity(name, tk.LEFT)
+        if tail is not None:
+            self.buffer.set_tail(tail)
+        return lines
+
+    def _keep_view(self, top, line_delta):
+        """内容在视口上方增减 line_delta 行后，保持视口显示的内容不变"""
+        line, col = map(int, top.split("."))
+        self.widget.yview(f"{max(line + line_delta, 1)}.{col}")
+
+    def _page_up(self):
+        """在顶部换入更早的一页消息"""
+        self.buffer.flush()
+        start = max(0, self.lo - self.page_messages)
+        top = self.widget.index("@0,0")
+        lines = self._insert("1.0", self.entries[start:self.lo])
+        if self.lo < self.hi:
+            # 原顶部消息的标记为左侧重力，在其位置插入后需要重新定位
+            self.widget.mark_set(self._mark(self.entries[self.lo]), f"{1 + lines}.0")
+            self._keep_view(top, lines)
+        self.lo = start
+        self._shrink("bottom")
+
+    def _page_down(self):
+        """在底部换入更新的一页消息"""
+        self.buffer.flush()
+        end = min(len(self.entries), self.hi + self.page_messages)
+        self._insert("end-1c", self.entries[self.hi:end])
+        self.hi = end
+        self._shrink("top")
+
+    def _shrink(self, side):
+        """超出字符上限时，从 side（"top" 或 "bottom"）一侧换出完全位于视口之外的消息；
+        只从一侧换出，避免刚换入的消息又被立即换出"""
+        self.buffer.flush()
+        while self.window_chars > self.max_chars and self.hi - self.lo > 1:
+            top = self.widget.index("@0,0")
+            bottom = self.widget.index(f"@0,{self.widget.winfo_height()}")
+            second = self._mark(self.entries[self.lo + 1])
+            last = self._mark(self.entries[self.hi - 1])
+            if side == "top" and self.widget.compare(second, "<=", top):
+                lines = int(self.widget.index(second).split(".")[0]) - 1
+                self.widget.config(state='normal')
+                self.widget.delete("1.0", second)
+                self.widget.config(state='disabled')
+                self._remove_window_entry(self.lo)
+                self.lo += 1
+                self._keep_view(top, -lines)
+            elif side == "bottom" and self.widget.compare(last, ">", bottom):
+                self.widget.config(state='normal')
+                self.widget.delete(last, tk.END)
+                self.widget.config(state='disabled')
+                self.hi -= 1
+                self._remove_window_entry(self.hi)
+                if self.hi == len(self.entries) - 1:
+                    self._drop_stream()
+            else:
+                break
+
+    def _drop_stream(self):
+        """未结束的消息已从控件中换出：丢弃增量解析状态和临时尾部，换入时再重建"""
+        if self._stream is not None:
+            self._stream = None
+            self.buffer.drop_tail()
+
+    def _remove_window_entry(self, position):
+        entry = self.entries[position]
+        self.widget.mark_unset(self._mark(entry))
+        self.window_chars -= entry["size"]
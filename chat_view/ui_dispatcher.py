@@ -0,0 +1,59 @@
+import queue
+import time
+import traceback
+from collections import deque
+
+
+class UiDispatcher:
+    """主线程 UI 调度器：工作线程只把更新投递到队列，主线程按固定节拍成批取出执行，不在工作线程中触碰 Tk"""
+
+    def __init__(self, root, interval_ms=16, budget_ms=12):
+        self.root = root
+        self.interval_ms = interval_ms  # 两次取队列之间的间隔（约 60 Hz）
+        self.budget_ms = budget_ms  # 每批最多执行的时长，剩余事件留到下一帧，避免一次积压过多导致界面卡顿
+        self._queue = queue.SimpleQueue()
+        self._pending = deque()  # 已取出、等待执行的事件
+        self._after_id = None
+
+    def post(self, callback, *args):
+        """投递一个在主线程执行的调用（任意线程可用）"""
+        self._queue.put((callback, args, False))
+
+    def post_text(self, callback, text):
+        """投递一次文本追加；同一帧内对同一回调的连续追加会合并为一次调用"""
+        self._queue.put((callback, (text,), True))
+
+    def start(self):
+        """开始按固定节拍处理队列"""
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        """停止处理队列（窗口关闭前调用）"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _drain(self):
+        """取出当前积压的事件，合并连续的文本追加后依次执行，超出本帧时长的部分留到下一帧"""
+        pending = self._pending
+        while True:
+            try:
+                callback, args, mergeable = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if mergeable and pending and pending[-1][2] and pending[-1][0] == callback:
+                pending[-1] = (callback, (pending[-1][1][0] + args[0],), True)
+            else:
+                pending.append((callback, args, mergeable))
+
+        deadline = time.monotonic() + self.budget_ms / 1000
+        while pending and time.monotonic() < deadline:
+            callback, args, _ = pending.popleft()
+            try:
+                callback(*args)
+            except Exception:
+                # 单个回调出错不影响后续事件和调度节拍
+                traceback.print_exc()
+
+        self._after_id = self.root.after(self.interval_ms, self._drain)
@@ -5,9 +5,31 @@ import time
 import threading
 import json
 import os
+import sqlite3
 import webbrowser
 from prompts_manager.prompts_manager import PromptsManager
 from prompts_manager.system_prompt_manager import SystemPromptManager
+from api_client.sse_stream import iter_sse_events, StreamAccumulator
+from api_client.chat_request import ChatRequest, RequestCancelled
+from api_client.http_session import SessionPool
+from api_client.retry_policy import RetryPolicy
+from api_client.rate_limiter import RateLimiterPool
+from api_client.usage_stats import UsageStats
+from api_client.response_cache import ResponseCache
+from history_manager.context_window import ContextWindow, get_context_tokens, get_prompt_budget, messages_tokens
+from chat_view.ui_dispatcher import UiDispatcher
+from chat_view.render_buffer import RenderBuffer
+from chat_view.transcript import ChatTranscript
+from chat_view.reply_viewer import ReplyViewerManager
+from chat_view.font_manager import FontManager
+from chat_view.history_list import HistoryList
+from chat_view.markdown_render import configure_markdown_tags
+from chat_view.syntax_highlight import SyntaxHighlighter
+from history_manager.journal import ConversationJournal
+from history_manager.directory_watcher import DirectoryWatcher
+from history_manager.history_store import HistoryStore, MATCH_START, MATCH_END
+from history_manager.summary_worker import (SummaryStore, SummaryWorker, SUMMARY_MAX_TOKENS,
+                                            build_summary_prompt, build_summary_message)
 
 
 # 加载配置文件
@@ -39,6 +61,9 @@ class DeepSeekChatApp:
         self.root.title("AI Chat")
         # 绑定窗口关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self.on_window_close)
+        # 工作线程通过 self.ui 投递界面更新，由主线程按固定节拍统一执行
+        self.ui = UiDispatcher(self.root)
+        self.ui.start()
 
         # 加载配置
         self.CONFIG_FILE = "deepseekconfig.json"
@@ -47,10 +72,46 @@ class DeepSeekChatApp:
         self.API_KEY = config.get("API_KEY", DEFAULT_CONFIG["API_KEY"])
         self.max_history_length = config.get("max_history_length", DEFAULT_CONFIG["max_history_length"])
         self.max_tokens = config.get("max_tokens", DEFAULT_CONFIG["max_tokens"])
+        self.context_tokens = config.get("context_tokens", DEFAULT_CONFIG["context_tokens"])  # 0 表示按模型自动确定
+        self.trim_mode = config.get("trim_mode", DEFAULT_CONFIG["trim_mode"])
+        self.auto_summary = config.get("auto_summary", DEFAULT_CONFIG["auto_summary"])
+        self.stream_enabled = config.get("stream", DEFAULT_CONFIG["stream"])
+        self.max_retries = config.get("max_retries", DEFAULT_CONFIG["max_retries"])
+        self.retry_backoff = config.get("retry_backoff", DEFAULT_CONFIG["retry_backoff"])
+        self.retry_jitter = config.get("retry_jitter", DEFAULT_CONFIG["retry_jitter"])
+        self.response_cache_enabled = config.get("response_cache", DEFAULT_CONFIG["response_cache"])
+        self.cache_ttl_hours = config.get("cache_ttl_hours", DEFAULT_CONFIG["cache_ttl_hours"])
+        self.cache_max_mb = config.get("cache_max_mb", DEFAULT_CONFIG["cache_max_mb"])
+        self.reply_viewer_limit = config.get("reply_viewer_limit", DEFAULT_CONFIG["reply_viewer_limit"])
+
+        # 创建可复用的 HTTP 会话，并在后台预热到 API 的连接
+        self.session_pool = SessionPool()
+        self.session_pool.warm_up(self.API_URL)
+
+        # 客户端限流：按 API_URL 配置每分钟请求数和 token 数预算，所有发送路径共享
+        self.rate_limits = dict(config.get("rate_limits", DEFAULT_CONFIG["rate_limits"]))
+        self.rate_limiter_pool = RateLimiterPool()
+        for api_url, limits in self.rate_limits.items():
+            self.rate_limiter_pool.configure(api_url, limits.get("rpm", 0), limits.get("tpm", 0))
+
+        # 温度为 0 的确定性请求的磁盘响应缓存（撤回后重发、重新加载历史后重问时可直接返回）
+        self.response_cache = ResponseCache(os.path.join("cache", "response_cache.db"),
+                                            int(self.cache_max_mb * 1024 * 1024), int(self.cache_ttl_hours * 3600))
+        # 历史对话的全文检索索引（由 history/ 下的 JSON 文件增量同步）
+        self.history_store = HistoryStore(os.path.join("cache", "history_index.db"))
+        self.search_results = {}  # 历史窗口当前的搜索结果 {文件名: [(消息下标, 角色, 摘要)]}
 
         # 参数设置
         self.temperature = 1.5  # 默认温度参数
         self.conversation_history = []  # 初始化对话历史
+        self.context_window = ContextWindow(self.trim_mode)  # 上下文窗口（决定每次发送哪些历史）
+        self.usage_stats = UsageStats()  # 本对话的 token 用量与缓存命中统计
+        self.history_file_path = None  # 当前对话对应的历史文件（加载或保存后才有）
+        self.summary_store = SummaryStore()  # 早期对话摘要缓存
+        self.summary_worker = SummaryWorker(self.request_summary, self.on_summary_ready)
+        # 回复查看窗口：同类回复复用同一个窗口，窗口数有上限（0 表示不弹出）
+        self.reply_viewers = ReplyViewerManager(self.root, self.reply_viewer_limit, on_copy=self.copy_to_clipboard,
+                                                on_save=self.save_as_md, on_create=self.setup_reply_viewer)
         self.system_prompt = ""  # 默认系统提示词
 
         # 模型选择
@@ -96,6 +157,8 @@ class DeepSeekChatApp:
         self.history_dir = "history"
         if not os.path.exists(self.history_dir):
             os.makedirs(self.history_dir)
+        # 当前对话的追加式日志：异常退出后下次启动时恢复，较长的对话定期压缩保存为历史文件
+        self.journal = ConversationJournal(os.path.join(self.history_dir, ".deepseek_session.jsonl"), self.history_dir)
         self.history_button = tk.Button(self.control_frame, text="加载历史", command=self.show_history_window)
         self.history_button.pack(side=tk.RIGHT, padx=(10, 0))
 
@@ -103,16 +166,18 @@ class DeepSeekChatApp:
         self.system_prompt_button = tk.Button(self.control_frame, text="系统提示词", command=self.open_system_prompt_editor)
         self.system_prompt_button.pack(side=tk.RIGHT, padx=(10, 0))
 
-        # 初始化字体大小
-        self.font_size = 12
-        self.min_font_size = 6
-        self.max_font_size = 40
+        # 添加思考过程面板开关按钮
+        self.think_button = tk.Button(self.control_frame, text="显示思考", command=self.toggle_think_pane)
+        self.think_button.pack(side=tk.RIGHT, padx=(10, 0))
+
+        # 按用途共享的命名字体，缩放时引用它的控件由 Tk 统一更新
+        self.fonts = FontManager(self.root)
         
         # 创建样式对象并配置
         self.style = ttk.Style()
         # 配置文本控件样式
         self.style.configure('TText', 
-            font=('Arial', self.font_size),
+            font=('Arial', 12),
             foreground='black',
             background='white',
             padding=5,
@@ -120,7 +185,7 @@ class DeepSeekChatApp:
         )
         # 配置按钮样式
         self.style.configure('TButton',
-            font=('Arial', self.font_size),
+            font=('Arial', 12),
             padding=5,
             relief=tk.RAISED
         )
@@ -136,12 +201,16 @@ class DeepSeekChatApp:
         self.chat_container = tk.Frame(root)
         self.chat_container.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
         
+        # 创建左右分栏：左侧为聊天显示区域，右侧为可折叠的思考过程面板
+        self.chat_paned = tk.PanedWindow(self.chat_container, orient=tk.HORIZONTAL, sashwidth=4)
+        self.chat_paned.pack(fill=tk.BOTH, expand=True)
+
         # 创建聊天显示区域
         self.chat_display = scrolledtext.ScrolledText(
-            self.chat_container, 
+            self.chat_paned, 
             wrap=tk.WORD, 
             state='disabled',
-            font=('Arial', self.font_size),
+            font=self.fonts.get("chat"),
 
         )
         
@@ -149,7 +218,28 @@ class DeepSeekChatApp:
         self.chat_display.bind('<Control-MouseWheel>', self.zoom_font)
         self.chat_display.bind('<Control-Button-4>', self.zoom_font)  # Linux zoom
         self.chat_display.bind('<Control-Button-5>', self.zoom_font)  # Linux zoom
-        self.chat_display.pack(fill=tk.BOTH, expand=True)
+        # 标签只在创建时配置一次；所有写入经由渲染缓冲按帧合并，并为每条消息记录位置
+        self.chat_display.tag_config('red', foreground='red')
+        configure_markdown_tags(self.chat_display, self.fonts)
+        # 代码块高亮在后台线程切分，只处理视口中的代码块
+        self.highlighter = SyntaxHighlighter(self.chat_display, self.ui.post)
+        self.transcript = ChatTranscript(self.chat_display, on_view_change=self.highlighter.schedule)
+        # ScrolledText 实际由外层 frame 承载，需将 frame 加入分栏
+        self.chat_paned.add(self.chat_display.frame, stretch="always")
+
+        # 创建思考过程面板（默认折叠，收到 reasoning_content 时自动展开）
+        self.think_frame = tk.Frame(self.chat_paned)
+        tk.Label(self.think_frame, text="思考过程", fg="gray").pack(anchor='w')
+        self.think_display = scrolledtext.ScrolledText(
+            self.think_frame,
+            wrap=tk.WORD,
+            state='disabled',
+            font=self.fonts.get("chat"),
+            foreground='gray'
+        )
+        self.think_display.pack(fill=tk.BOTH, expand=True)
+        self.think_buffer = RenderBuffer(self.think_display)
+        self.think_visible = False
         
         # 设置容器最大高度
         self.chat_container.pack_propagate(False)
@@ -160,7 +250,7 @@ class DeepSeekChatApp:
         self.input_frame.pack(padx=10, pady=10, fill=tk.X)
 
         # 使用Text控件代替Entry，并添加滚动条
-        self.user_input = tk.Text(self.input_frame, height=5, wrap=tk.WORD, font=('Arial', 12))
+        self.user_input = tk.Text(self.input_frame, height=5, wrap=tk.WORD, font=self.fonts.get("input"))
         self.user_input.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
 
@@ -189,16 +279,32 @@ class DeepSeekChatApp:
         self.clear_history_button = tk.Button(self.top_button_frame, text="清空", command=self.clear_history, width=4)
         self.clear_history_button.pack(side=tk.LEFT)
 
+        # 停止按钮：中断进行中的回复
+        self.stop_button = tk.Button(self.top_button_frame, text="停止", command=self.stop_generation, width=4, state='disabled')
+        self.stop_button.pack(side=tk.LEFT, padx=(2, 0))
+        self.active_request = None  # 当前进行中的请求
+
         # 保存历史按钮
         self.save_history_button = tk.Button(self.button_frame, text="保存历史", command=self.save_history, width=10)
         self.save_history_button.pack(side=tk.TOP, pady=(1, 1))
 
+        # 重新生成按钮：丢弃最后一条AI回复并重新请求
+        self.regenerate_button = tk.Button(self.button_frame, text="重新生成", command=self.regenerate_last_reply, width=10)
+        self.regenerate_button.pack(side=tk.TOP, pady=(1, 1))
+
         # 添加加载指示器
         self.loading_label = tk.Label(root, text="", fg="blue")
+        self.timer_after_id = None  # 加载计时器的 after 任务
         self.loading_label.pack()
 
+        # 添加本对话用量统计（含前缀缓存命中情况）
+        self.usage_label = tk.Label(root, text="", fg="gray")
+        self.usage_label.pack()
+
         # 绑定回车键发送消息（注意：现在需要处理多行输入）
         self.root.bind('<Return>', self.handle_enter_key)
+        # 绑定 Esc 键停止生成
+        self.root.bind('<Escape>', lambda e: self.stop_generation())
 
         # 初始化系统提示词输入框
         self.system_prompt_text = None
@@ -207,6 +313,33 @@ class DeepSeekChatApp:
         self.prompts_manager = PromptsManager(root, main_app=self, main_input=self.user_input)
         self.system_prompt_manager = SystemPromptManager(root, self.prompts_manager, main_app=self)
 
+        # 监视历史和 Prompts 目录：其他程序或同步盘新增、修改、删除文件时，只增量更新对应的条目
+        self.history_watcher = DirectoryWatcher(self.history_dir, self.on_history_dir_changed)
+        self.prompts_watcher = DirectoryWatcher(self.prompts_manager.prompts_dir, self.on_prompts_dir_changed)
+        self.history_watcher.start()
+        self.prompts_watcher.start()
+
+        # 上次未正常退出时，由对话日志恢复对话
+        self.recover_session()
+
+    def recover_session(self):
+        """由对话日志恢复上次未正常退出时的对话"""
+        recovered = ConversationJournal.recover(self.journal.path)
+        if recovered is None:
+            # 无法恢复的旧日志（只有系统提示词或快照文件已丢失）整体替换为当前对话，不再把新记录追加在其后
+            if os.path.exists(self.journal.path):
+                self.journal.new_session(self.conversation_history)
+            return
+        messages, snapshot_path = recovered
+        self.conversation_history = messages
+        self.journal.resume(messages, snapshot_path)
+        system_messages = [msg for msg in messages if msg["role"] == "system"]
+        if system_messages:
+            self.system_prompt = system_messages[0]["content"]
+            self.system_prompt_manager.system_prompt = self.system_prompt
+        self.render_history()
+        self.display_message("系统", "已恢复上次未正常退出时的对话")
+
     def save_history(self):
         """保存历史对话，返回是否成功保存"""
         if not self.conversation_history:
@@ -229,6 +362,9 @@ class DeepSeekChatApp:
             if file_path.endswith(".json"):
                 with open(file_path, 'w', encoding='utf-8') as file:
                     json.dump(self.conversation_history, file, ensure_ascii=False, indent=4)
+                # 摘要缓存随历史文件一起保存，重新加载时无需再次生成
+                self.history_file_path = file_path
+                self.summary_store.save(file_path)
             elif file_path.endswith(".md"):
                 with open(file_path, 'w', encoding='utf-8') as file:
                     # 将对话历史转换为Markdown格式
@@ -249,28 +385,52 @@ class DeepSeekChatApp:
         """显示历史对话窗口"""
         self.history_window = tk.Toplevel()
         self.history_window.title("历史对话")
-        self.history_window.geometry("800x600")
+        self.history_window.geometry("1000x600")
 
         # 使用grid布局
         self.history_window.grid_columnconfigure(0, weight=1)
         self.history_window.grid_rowconfigure(1, weight=1)
 
+        # 创建搜索栏：在全部历史对话的消息中全文检索
+        search_frame = tk.Frame(self.history_window)
+        search_frame.grid(row=0, column=0, sticky='ew', padx=10, pady=(10, 0))
+        tk.Label(search_frame, text="搜索:").pack(side=tk.LEFT)
+        self.history_search_var = tk.StringVar()
+        tk.Entry(search_frame, textvariable=self.history_search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.history_status = tk.Label(search_frame, text="正在更新索引...")
+        self.history_status.pack(side=tk.RIGHT)
+        self.history_search_after_id = None
+        self.search_results = {}
+        self.history_search_var.trace_add("write", self.schedule_history_search)
+
         # 创建主容器
         main_frame = tk.Frame(self.history_window)
-        main_frame.grid(row=0, column=0, sticky='nsew', padx=10, pady=10)
+        main_frame.grid(row=1, column=0, sticky='nsew', padx=10, pady=10)
 
         # 配置主容器grid布局
         main_frame.grid_columnconfigure(1, weight=1)
         main_frame.grid_rowconfigure(0, weight=1)
 
         # 创建文件列表
-        self.file_listbox = ttk.Treeview(main_frame, selectmode="browse", show="tree")
+        self.file_listbox = ttk.Treeview(main_frame, selectmode="browse", show="tree headings",
+                                         columns=("title", "count", "modified"))
+        # 标题、消息数和修改时间来自历史索引中的元数据，不需要打开文件
+        self.file_listbox.heading("#0", text="文件")
+        self.file_listbox.heading("title", text="标题")
+        self.file_listbox.heading("count", text="消息数")
+        self.file_listbox.heading("modified", text="修改时间")
+        self.file_listbox.column("#0", width=160)
+        self.file_listbox.column("title", width=180)
+        self.file_listbox.column("count", width=50, anchor='e')
+        self.file_listbox.column("modified", width=110)
         self.file_listbox.grid(row=0, column=0, sticky='ns', padx=(0, 10))
 
         # 添加滚动条
         scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self.file_listbox.yview)
         scrollbar.grid(row=0, column=1, sticky='ns')
-        self.file_listbox.config(yscrollcommand=scrollbar.set)
+        # 文件列表在后台遍历目录，按页填充并按日期分组
+        self.history_list = HistoryList(self.file_listbox, scrollbar, self.ui.post,
+                                        on_error=lambda error: messagebox.showerror("错误", f"无法加载历史文件: {error}"))
         
         # 阻止所有ttk控件的缩放事件
         self.file_listbox.bind('<Control-MouseWheel>', lambda e: "break")
@@ -293,7 +453,7 @@ class DeepSeekChatApp:
             preview_frame, 
             wrap=tk.WORD, 
             state=tk.DISABLED, 
-            font=('Arial', 12)
+            font=self.fonts.get("preview")
         )
         # 阻止所有缩放事件
         self.preview_text.bind('<Control-MouseWheel>', lambda e: "break")
@@ -306,7 +466,7 @@ class DeepSeekChatApp:
 
         # 添加按钮容器
         button_frame = tk.Frame(self.history_window)
-        button_frame.grid(row=1, column=0, sticky='ew', padx=10, pady=(0, 10))
+        button_frame.grid(row=2, column=0, sticky='ew', padx=10, pady=(0, 10))
 
         # 添加加载按钮
         load_button = tk.Button(button_frame, text="加载", command=self.load_selected_history, width=10)
@@ -326,43 +486,131 @@ class DeepSeekChatApp:
         # 绑定选择事件
         self.file_listbox.bind("<<TreeviewSelect>>", self.show_preview)
 
-    def load_history_files(self):
-        """加载历史文件列表"""
-        self.file_listbox.delete(*self.file_listbox.get_children())
+        # 在后台同步检索索引（只重新索引新增或修改过的文件）
+        threading.Thread(target=self.sync_history_index, daemon=True).start()
+
+    def sync_history_index(self):
+        """工作线程：同步历史检索索引，完成后通知主线程"""
+        changed = 0
         try:
-            files = [f for f in os.listdir(self.history_dir) if f.endswith(".json")]
-            for file in sorted(files, reverse=True):
-                self.file_listbox.insert("", tk.END, text=file)
-        except Exception as e:
-            messagebox.showerror("错误", f"无法加载历史文件: {str(e)}")
+            changed = self.history_store.sync(self.history_dir)
+            note = "索引已更新"
+        except (OSError, sqlite3.Error) as e:
+            # 数据库被锁定、损坏或不支持 FTS5 时同样在状态栏提示
+            note = f"更新索引失败: {str(e)}"
+        self.ui.post(self.on_history_index_synced, note, changed)
+
+    def on_history_index_synced(self, note, changed):
+        """主线程：索引同步完成，重新执行当前的搜索；有文件变化时刷新列表中的元数据"""
+        if not self.history_window.winfo_exists():
+            return
+        self.history_status.config(text=note)
+        if self.history_search_var.get().strip():
+            self.run_history_search()
+        elif changed:
+            self.load_history_files()
+
+    def schedule_history_search(self, *args):
+        """搜索框内容变化：停止输入一段时间后再检索"""
+        if self.history_search_after_id is not None:
+            self.history_window.after_cancel(self.history_search_after_id)
+        self.history_search_after_id = self.history_window.after(200, self.run_history_search)
+
+    def run_history_search(self):
+        """按搜索框内容检索历史消息，列表只显示包含匹配消息的对话；搜索框为空时显示全部文件"""
+        self.history_search_after_id = None
+        query = self.history_search_var.get().strip()
+        if not query:
+            self.search_results = {}
+            self.load_history_files()
+            return
+        self.search_results = {}
+        for name, position, role, snippet in self.history_store.search(query):
+            self.search_results.setdefault(name, []).append((position, role, snippet))
+        metadata = self.history_store.list_metadata()
+        self.history_list.set_entries([(name, metadata[name]["mtime"] if name in metadata else 0)
+                                       for name in self.search_results], metadata, grouped=False)
+        matches = sum(len(items) for items in self.search_results.values())
+        self.history_status.config(text=f"找到 {matches} 条消息，{len(self.search_results)} 个对话")
+
+    def show_search_preview(self, matches):
+        """预览搜索命中的消息，并高亮命中的文本"""
+        self.preview_text.config(state=tk.NORMAL)
+        self.preview_text.delete(1.0, tk.END)
+        self.preview_text.tag_config('red', foreground='red')
+        self.preview_text.tag_config('match', background='yellow')
+        args = []
+        for position, role, snippet in matches:
+            args.extend((f"#{position} {role.capitalize()}: ", 'red'))
+            segments = snippet.split(MATCH_START)
+            args.extend((segments[0], ()))
+            for segment in segments[1:]:
+                hit, _, rest = segment.partition(MATCH_END)
+                args.extend((hit, 'match', rest, ()))
+            args.extend(("\n\n", ()))
+        self.preview_text.insert(tk.END, *args)
+        self.preview_text.config(state=tk.DISABLED)
+
+    def load_history_files(self):
+        """加载历史文件列表：目录遍历和元数据查询在后台线程进行，不阻塞界面；
+        目录监视已有结果时直接使用，不再遍历目录"""
+        self.history_list.load(self.history_dir, self.history_store.list_metadata, self.history_watcher.snapshot)
+
+    def on_history_dir_changed(self, added, modified, removed):
+        """监视线程：只重新索引变化的历史文件，再通知主线程更新列表"""
+        changed = {}
+        for name in added + modified:
+            metadata = self.history_store.index_file(os.path.join(self.history_dir, name))
+            if metadata is not None:
+                changed[name] = metadata
+        for name in removed:
+            self.history_store.remove(name)
+        self.ui.post(self.apply_history_changes, changed, removed)
+
+    def apply_history_changes(self, changed, removed):
+        """主线程：历史窗口打开时，把目录变化应用到文件列表"""
+        if not (hasattr(self, 'history_window') and self.history_window.winfo_exists()):
+            return
+        for name in removed:
+            self.search_results.pop(name, None)
+            self.history_list.remove(name)
+        for name, metadata in changed.items():
+            self.history_list.upsert(name, metadata["mtime"], metadata)
+
+    def on_prompts_dir_changed(self, added, modified, removed):
+        """监视线程：只读取新增或修改的 Prompt 文件，再交给主线程更新"""
+        loaded = self.prompts_manager.read_prompt_files(added + modified)
+        self.ui.post(self.prompts_manager.apply_changes, loaded, removed)
 
     def show_preview(self, event):
         """显示选中文件的预览"""
-        selection = self.file_listbox.selection()
-        if not selection:
+        selected_file = self.history_list.selected_file()
+        if not selected_file:
             return
 
-        selected_file = self.file_listbox.item(selection[0], "text")
         file_path = os.path.join(self.history_dir, selected_file)
+        # 搜索时只预览命中的消息
+        if selected_file in self.search_results:
+            self.show_search_preview(self.search_results[selected_file])
+            return
 
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                history = json.load(f)
-                self.preview_text.config(state=tk.NORMAL)
-                self.preview_text.delete(1.0, tk.END)
-                
-                # 配置红色文本标签
-                self.preview_text.tag_config('red', foreground='red')
-                
-                for msg in history[-10:]:  # 显示最后10条消息
-                    role = msg["role"].capitalize()
-                    content = msg["content"][:100] + "..."
-                    
-                    # 插入带格式的文本
-                    self.preview_text.insert(tk.END, role + ": ", 'red')
-                    self.preview_text.insert(tk.END, content + "\n\n")
-                
-                self.preview_text.config(state=tk.DISABLED)
+            # 预览片段预先保存在索引中，文件未变化时不再解析整个文件
+            metadata = self.history_store.metadata(file_path)
+            self.preview_text.config(state=tk.NORMAL)
+            self.preview_text.delete(1.0, tk.END)
+
+            # 配置红色文本标签
+            self.preview_text.tag_config('red', foreground='red')
+
+            summary = f"{metadata['message_count']} 条消息 · 约 {metadata['tokens']} tokens"
+            self.preview_text.insert(tk.END, summary + "\n\n")
+            for role, content in metadata["preview"]:  # 显示最后10条消息
+                # 插入带格式的文本
+                self.preview_text.insert(tk.END, role.capitalize() + ": ", 'red')
+                self.preview_text.insert(tk.END, content + "...\n\n")
+
+            self.preview_text.config(state=tk.DISABLED)
         except Exception as e:
             self.preview_text.config(state=tk.NORMAL)
             self.preview_text.delete(1.0, tk.END)
@@ -371,12 +619,14 @@ class DeepSeekChatApp:
 
     def load_selected_history(self):
         """加载选中的历史对话"""
-        selection = self.file_listbox.selection()
-        if not selection:
+        if self.active_request is not None:
+            messagebox.showwarning("警告", "请先等待当前回复完成或点击“停止”")
+            return
+        selected_file = self.history_list.selected_file()
+        if not selected_file:
             messagebox.showwarning("警告", "请先选择一个历史文件")
             return
 
-        selected_file = self.file_listbox.item(selection[0], "text")
         file_path = os.path.join(self.history_dir, selected_file)
 
         try:
@@ -384,6 +634,9 @@ class DeepSeekChatApp:
                 history = json.load(f)
                 self.history_window.destroy()
                 self.conversation_history = history
+                self.reset_conversation_state()
+                self.history_file_path = file_path
+                self.summary_store.load(file_path)
                 
                 # 更新系统提示词
                 system_messages = [msg for msg in history if msg["role"] == "system"]
@@ -399,12 +652,7 @@ class DeepSeekChatApp:
                             self.system_prompt_manager.update_system_prompt_display()
                 
                 # 更新聊天显示
-                self.chat_display.config(state=tk.NORMAL)
-                self.chat_display.delete("1.0", tk.END)
-                # 过滤掉system消息显示
-                for msg in history:
-                    if msg["role"] != "system":
-                        self.display_message(msg["role"].capitalize(), msg["content"])
+                self.render_history()
                 
                 messagebox.showinfo("成功", "历史对话已加载（系统提示词已加载）")
         except json.JSONDecodeError as e:
@@ -416,17 +664,22 @@ class DeepSeekChatApp:
 
     def delete_selected_history(self):
         """删除选中的历史对话"""
-        selection = self.file_listbox.selection()
-        if not selection:
+        selected_file = self.history_list.selected_file()
+        if not selected_file:
             messagebox.showwarning("警告", "请先选择一个历史文件")
             return
 
-        selected_file = self.file_listbox.item(selection[0], "text")
         file_path = os.path.join(self.history_dir, selected_file)
 
         try:
             os.remove(file_path)
-            self.load_history_files()
+            # 一并删除对应的摘要缓存
+            summary_path = SummaryStore.sidecar_path(file_path)
+            if os.path.exists(summary_path):
+                os.remove(summary_path)
+            self.history_store.remove(selected_file)
+            self.search_results.pop(selected_file, None)
+            self.history_list.remove(selected_file)
             self.preview_text.config(state=tk.NORMAL)
             self.preview_text.delete(1.0, tk.END)
             self.preview_text.config(state=tk.DISABLED)
@@ -437,10 +690,12 @@ class DeepSeekChatApp:
     def show_loading(self, message="加载中..."):
         """显示加载指示器，并启动计时器"""
         self.loading_start_time = time.time()  # 记录加载开始时间
+        self.loading_note = ""  # 附加在计时器后的状态说明（如重试等待）
         self.loading_label.config(text=message)
-        self.root.update()
-        
-        # 启动计时器更新
+
+        # 启动计时器更新（先取消上一次请求遗留的计时器）
+        if self.timer_after_id is not None:
+            self.root.after_cancel(self.timer_after_id)
         self.update_timer()
 
     def update_timer(self):
@@ -451,19 +706,27 @@ class DeepSeekChatApp:
                 self.show_timeout_popup()
             minutes = int(elapsed_time // 60)
             seconds = int(elapsed_time % 60)
-            self.loading_label.config(text=f"已加载 {minutes} 分 {seconds} 秒")  # 更新计时器显示
-            self.root.update()
-            
+            self.loading_label.config(text=f"已加载 {minutes} 分 {seconds} 秒  {self.loading_note}")  # 更新计时器显示
+
             # 每隔 1 秒更新一次计时器
-            self.root.after(1000, self.update_timer)
+            self.timer_after_id = self.root.after(1000, self.update_timer)
 
 
+    def set_loading_note(self, request, note):
+        """更新加载指示器上的状态说明（仅对当前请求生效）"""
+        if self.active_request is request and hasattr(self, 'loading_start_time'):
+            self.loading_note = note
+            elapsed_time = time.time() - self.loading_start_time
+            self.loading_label.config(text=f"已加载 {int(elapsed_time // 60)} 分 {int(elapsed_time % 60)} 秒  {note}")
+
     def hide_loading(self):
         """隐藏加载指示器并停止计时器"""
         if hasattr(self, 'loading_start_time'):
             del self.loading_start_time  # 删除计时器记录
+        if self.timer_after_id is not None:
+            self.root.after_cancel(self.timer_after_id)
+            self.timer_after_id = None
         self.loading_label.config(text="")
-        self.root.update()
 
     def show_timeout_popup(self):
         """显示超时弹窗"""
@@ -480,109 +743,62 @@ class DeepSeekChatApp:
         # 添加关闭按钮
         ttk.Button(popup, text="关闭", command=popup.destroy).pack(pady=10)
 
-    def display_message(self, sender, message):
-        """显示消息到聊天窗口"""
-        # 配置红色文本标签
-        self.chat_display.tag_config('red', foreground='red')
-        
-        self.chat_display.config(state='normal')  # 启用编辑
-        # 插入带格式的文本
-        self.chat_display.insert(tk.END, sender + ": ", 'red')
-        self.chat_display.insert(tk.END, message + "\n\n")
-        self.chat_display.config(state='disabled')  # 禁用编辑
-        self.chat_display.yview(tk.END)  # 自动滚动到底部        
-        # 如果是AI的回复，显示在弹出窗口
-        if sender == self.selected_model.get():
-            self.show_popup(message)
+    def display_message(self, sender, message, history_index=None):
+        """显示消息到聊天窗口；history_index 为该消息在对话历史中的下标（系统提示等为 None）"""
+        # 写入渲染缓冲，同一帧内的多条消息合并为一次插入
+        # AI 回复（含缓存命中的回复）按 Markdown 渲染，用户消息和系统提示原样显示
+        self.transcript.add_message(sender, message, history_index, markdown=sender not in ("User", "系统"))
     
-    def show_popup(self, message,title="最新回复"):
-        """显示最新回复的弹出窗口"""
-        self.popup = tk.Toplevel(self.root)
-        self.popup.title(title)
-        self.popup.geometry("600x400")
-        
-        # 创建主容器
-        main_frame = tk.Frame(self.popup)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        # 配置网格布局
-        main_frame.grid_rowconfigure(0, weight=1)
-        main_frame.grid_columnconfigure(0, weight=1)
-        
-        # 创建文本容器
-        text_container = tk.Frame(main_frame)
-        text_container.grid(row=0, column=0, sticky='nsew')
-        
-        # 配置文本容器网格
-        text_container.grid_rowconfigure(0, weight=1)
-        text_container.grid_columnconfigure(0, weight=1)
-        
-        # 创建文本框
-        self.popup_text_box = tk.Text(
-            text_container, 
-            wrap=tk.WORD, 
-            font=('Arial', 12),
-            width=80,  # Initial width in characters
-            height=20  # Initial height in lines
-        )
-        self.popup_text_box.insert(tk.END, message)
-        self.popup_text_box.config(state='disabled')
-        
-        # 添加垂直滚动条
-        v_scroll = ttk.Scrollbar(text_container, orient=tk.VERTICAL, command=self.popup_text_box.yview)
-        self.popup_text_box.config(yscrollcommand=v_scroll.set)
-        
-        # 布局文本框和滚动条
-        self.popup_text_box.grid(row=0, column=0, sticky='nsew')
-        v_scroll.grid(row=0, column=1, sticky='ns')
-        
-        # 配置网格权重
-        text_container.grid_rowconfigure(0, weight=1)
-        text_container.grid_columnconfigure(0, weight=1)
-        
-        # 添加字体缩放功能
-        self.popup_text_box.bind('<Control-MouseWheel>', self.zoom_popup_font)
+    def begin_stream_message(self, sender):
+        """开始流式显示一条AI回复，先插入发送者（回复完成后将追加到对话历史末尾）"""
+        self.transcript.begin_message(sender, len(self.conversation_history), markdown=True)
+
+    def append_stream_text(self, text):
+        """将流式收到的增量文本追加到聊天窗口"""
+        self.transcript.append(text)
+
+    def end_stream_message(self, message=None):
+        """结束流式显示；传入完整回复时显示在弹出窗口"""
+        self.transcript.end_message()
+        if message is not None:
+            self.show_popup(message)
 
-        
-        # 初始化弹出窗口字体大小
-        self.popup_font_size = 12
-        
-        # 创建按钮容器
-        button_frame = tk.Frame(main_frame)
-        button_frame.grid(row=1, column=0, sticky='ew', pady=(10, 0))
-        
-        # 配置按钮容器列权重
-        button_frame.grid_columnconfigure(0, weight=1)
-        button_frame.grid_columnconfigure(1, weight=1)
-        
-        # 添加复制按钮
-        copy_button = tk.Button(button_frame, text="复制", command=lambda: self.copy_to_clipboard(message), width=10)
-        copy_button.grid(row=0, column=0, padx=5)
-        
-        # 添加保存为.md文件按钮
-        save_button = tk.Button(button_frame, text="保存", command=lambda: self.save_as_md(message), width=10)
-        save_button.grid(row=0, column=1, padx=5)
+    def toggle_think_pane(self, show=None):
+        """展开或折叠思考过程面板"""
+        if show is None:
+            show = not self.think_visible
+        if show and not self.think_visible:
+            self.chat_paned.add(self.think_frame, width=300, minsize=120)
+            self.think_button.config(text="隐藏思考")
+        elif not show and self.think_visible:
+            self.chat_paned.forget(self.think_frame)
+            self.think_button.config(text="显示思考")
+        self.think_visible = show
+
+    def begin_think_message(self):
+        """开始显示新一轮的思考过程：清空面板并自动展开"""
+        self.think_buffer.clear()
+        self.toggle_think_pane(True)
+
+    def append_think_text(self, text):
+        """将思考过程的增量文本追加到思考面板"""
+        self.think_buffer.write(text)
+
+    def show_think_text(self, text):
+        """一次性显示完整的思考过程"""
+        self.begin_think_message()
+        self.append_think_text(text)
 
-        # 允许窗口大小调整
-        self.popup.resizable(True, True)
-        
-        # 绑定窗口大小变化事件
-        self.popup.bind('<Configure>', self.handle_popup_resize)
-        
-        # 绑定字体缩放事件
-        def zoom_font(event):
-            if event.delta > 0:  # 向上滚动
-                self.font_size = min(self.font_size + 1, self.max_font_size)
-            else:  # 向下滚动
-                self.font_size = max(self.font_size - 1, self.min_font_size)
-            
-            # 更新弹出窗口字体
-            self.popup_text_box.config(font=('Arial', self.font_size))
-            self.popup_text_box.update_idletasks()
-        
-        self.popup_text_box.bind('<Control-MouseWheel>', zoom_font)
+    def show_popup(self, message,title="最新回复"):
+        """在可复用的回复查看窗口中显示最新回复"""
+        self.reply_viewers.show(message, title)
 
-        
+    def setup_reply_viewer(self, viewer):
+        """回复查看窗口创建后设置共享字体并绑定字体缩放事件"""
+        viewer.text_box.config(font=self.fonts.get("popup"))
+        viewer.text_box.bind('<Control-MouseWheel>', self.zoom_popup_font)
+        viewer.text_box.bind('<Control-Button-4>', self.zoom_popup_font)  # Linux zoom
+        viewer.text_box.bind('<Control-Button-5>', self.zoom_popup_font)  # Linux zoom
 
     def copy_to_clipboard(self, text):
         """复制文本到剪贴板"""
@@ -591,72 +807,15 @@ class DeepSeekChatApp:
         messagebox.showinfo("成功", "文本已复制到剪贴板")
 
     def zoom_font(self, event):
-        """通过Ctrl+鼠标滚轮缩放聊天窗口字体"""
-        # 保存当前滚动位置
-        chat_scroll_position = self.chat_display.yview()
-        
-        # 计算缩放方向
-        if event.delta > 0:  # 向上滚动
-            self.font_size = min(self.font_size + 1, self.max_font_size)
-        else:  # 向下滚动
-            self.font_size = max(self.font_size - 1, self.min_font_size)
-        
-        # 更新聊天窗口字体
-        self.chat_display.config(font=('Arial', self.font_size))
-        
-        
-        # 强制更新布局
-        self.chat_display.update_idletasks()
-        
-        # 恢复滚动位置
-        self.chat_display.yview_moveto(chat_scroll_position[0])
-
-    def handle_popup_resize(self, event):
-        """处理弹出窗口大小变化"""
-        if not hasattr(self, 'popup_text_box') or not self.popup_text_box.winfo_exists():
-            return
-        
-        # 获取窗口新尺寸
-        new_width = event.width - 20  # 减去padding
-        new_height = event.height - 100  # 减去按钮区域高度
-        
-        # 更新文本框尺寸
-        self.popup_text_box.config(width=new_width, height=new_height)
-        self.popup_text_box.update_idletasks()
+        """通过Ctrl+鼠标滚轮缩放聊天窗口字体（思考面板共用同一字体）"""
+        # 只修改共享字体对象，Tk 保持当前首行位置，不会跳动
+        self.fonts.zoom("chat", self.fonts.zoom_step(event))
+        return "break"
 
     def zoom_popup_font(self, event):
-        """通过Ctrl+鼠标滚轮缩放弹出窗口字体"""
-        # 计算缩放方向
-        if event.delta > 0:  # 向上滚动
-            self.font_size = min(self.font_size + 1, self.max_font_size)
-        else:  # 向下滚动
-            self.font_size = max(self.font_size - 1, self.min_font_size)
-        
-        # 更新弹出窗口字体
-        if hasattr(self, 'popup_text_box') and self.popup_text_box.winfo_exists():
-            self.popup_text_box.config(font=('Arial', self.font_size))
-            self.popup_text_box.update_idletasks()
-        
-        # 更新主聊天窗口字体
-        self.chat_display.config(font=('Arial', self.font_size))
-        self.chat_display.update_idletasks()
-
-    def update_fonts(self):
-        """更新聊天窗口字体大小"""
-        # 获取聊天窗口当前尺寸
-        chat_height = int(self.chat_display.cget('height'))
-        chat_width = int(self.chat_display.cget('width'))
-        
-        # 更新聊天窗口字体
-        self.chat_display.config(
-            font=('Arial', self.font_size),
-            height=chat_height,
-            width=chat_width,
-            wrap=tk.WORD
-        )
-        
-        # 强制更新布局
-        self.chat_display.update_idletasks()
+        """通过Ctrl+鼠标滚轮缩放回复查看窗口字体（所有查看窗口共用同一字体）"""
+        self.fonts.zoom("popup", self.fonts.zoom_step(event))
+        return "break"
 
     def save_as_md(self, text):
         """将文本保存为.md文件"""
@@ -682,6 +841,9 @@ class DeepSeekChatApp:
 
     def undo_last_message(self):
         """撤回最后一条消息"""
+        if self.active_request is not None:
+            messagebox.showwarning("警告", "请先等待当前回复完成或点击“停止”")
+            return
         if len(self.conversation_history) < 2:  # 至少需要一条用户消息和一条AI回复
             messagebox.showwarning("警告", "没有可撤回的消息")
             return
@@ -691,53 +853,99 @@ class DeepSeekChatApp:
         
         # 移除最后两条消息（用户消息和AI回复）
         self.conversation_history = self.conversation_history[:-2]
+        self.journal.record(self.conversation_history)
         
-        # 更新聊天显示
-        self.chat_display.config(state='normal')
-        self.chat_display.delete("1.0", tk.END)
-        
-        # 重新显示剩余的历史消息
-        for msg in self.conversation_history:
-            if msg["role"] != "system":  # 不显示系统提示
-                self.display_message(msg["role"].capitalize(), msg["content"])
+        # 更新聊天显示：只删除最后一轮对话的显示内容
+        if not self.transcript.truncate(len(self.conversation_history)):
+            self.render_history()
         
         # 将最后一条用户消息放入输入框
         self.user_input.delete("1.0", tk.END)
         self.user_input.insert(tk.END, last_user_message)
         
-        self.chat_display.config(state='disabled')
         self.display_message("系统", "已撤回最后一条对话，消息已放入输入框")
 
+    def regenerate_last_reply(self):
+        """丢弃最后一条AI回复，用同一条用户消息重新请求"""
+        if self.active_request is not None:
+            messagebox.showwarning("警告", "请先等待当前回复完成或点击“停止”")
+            return
+        if len(self.conversation_history) < 2 or self.conversation_history[-1]["role"] != "assistant":
+            messagebox.showwarning("警告", "没有可重新生成的回复")
+            return
+
+        user_message = self.conversation_history[-2]["content"]
+        # 停止或失败时回滚到包含原回复的完整历史
+        history_before = list(self.conversation_history)
+        self.conversation_history = self.conversation_history[:-1]
+        self.journal.record(self.conversation_history)
+        # 只删除最后一条AI回复（及其后的提示）的显示内容
+        if not self.transcript.truncate(len(self.conversation_history)):
+            self.render_history()
+        # 重新生成时跳过响应缓存，新回复会覆盖缓存中的旧回复
+        self.start_request(user_message, history_before, use_cache=False, regenerate=True)
+
+    def render_history(self):
+        """按对话历史重新显示全部消息（批量载入，只渲染末尾一页）"""
+        # 过滤掉system消息显示
+        self.transcript.load([(msg["role"].capitalize(), msg["content"], index, msg["role"] == "assistant")
+                              for index, msg in enumerate(self.conversation_history) if msg["role"] != "system"])
+
+    def insert_history_message(self, index, message):
+        """在对话历史中插入一条消息（如补上系统提示词）：聊天记录中其后消息的历史下标随之后移，并记录日志"""
+        self.conversation_history.insert(index, message)
+        if self.active_request is not None:
+            # 停止或失败时回滚到的历史也要包含这条消息
+            self.active_request.history_before.insert(index, message)
+        self.transcript.shift_history_indexes(index, 1)
+        self.journal.record(self.conversation_history)
+
     def clear_history(self):
         """清空对话历史"""
+        if self.active_request is not None:
+            messagebox.showwarning("警告", "请先等待当前回复完成或点击“停止”")
+            return
         self.conversation_history = []
-        self.chat_display.config(state='normal')  # 启用编辑
-        self.chat_display.delete("1.0", tk.END)  # 清空聊天框
-        self.chat_display.config(state='disabled')  # 禁用编辑
+        self.reset_conversation_state()
+        self.transcript.clear()  # 清空聊天框
         self.display_message("系统", "对话历史已清空")
 
+    def reset_conversation_state(self):
+        """对话被清空或替换后，重置上下文窗口和用量统计"""
+        self.context_window.reset()
+        self.usage_stats.reset()
+        self.usage_label.config(text="")
+        self.history_file_path = None
+        self.summary_store = SummaryStore()
+        self.journal.new_session(self.conversation_history)
+
+    def update_usage_stats(self, usage):
+        """累加一次响应的 usage 并刷新统计显示"""
+        self.usage_stats.add(usage)
+        self.usage_label.config(text=self.usage_stats.summary())
+
     def send_message(self):
         # 获取用户输入并限制最大长度
         user_message = self.user_input.get("1.0", tk.END).strip()
         if user_message == "":
             return
 
+        # 同一时间只处理一个请求，避免并发修改对话历史
+        if self.active_request is not None:
+            # 提示显示在加载指示器上，不写入聊天记录，以免打断流式输出中的回复
+            self.root.bell()
+            self.set_loading_note(self.active_request, "上一条回复尚未完成，请等待或点击“停止”")
+            return
+
         # 限制消息长度（例如8000字符）
         if len(user_message) > 80000:
             self.display_message("系统", "消息过长,请缩短至80000字符以内")
             return
 
-        # 显示用户消息
-        self.display_message("User", user_message)
         self.user_input.delete("1.0", tk.END)  # 清空输入框
 
-        # 启动一个新线程来处理API请求
-        threading.Thread(target=self.get_deepseek_response_thread, args=(user_message,)).start()
-
-    def get_deepseek_response_thread(self, user_message):
-        """在新线程中调用DeepSeek API获取回复"""
-        # 显示加载指示器
-        self.show_loading("正在处理请求，请稍候...")
+        # 记录发送前的历史，停止或失败时据此回滚
+        history_before = list(self.conversation_history)
 
         # 如果历史为空，添加系统提示
         if not self.conversation_history:
@@ -745,71 +953,286 @@ class DeepSeekChatApp:
 
         # 添加用户消息
         self.conversation_history.append({"role": "user", "content": user_message})
+        self.journal.record(self.conversation_history)
 
-        # 限制历史长度
-        if len(self.conversation_history) > self.max_history_length * 2:
-            # 检查是否包含 system 消息
-            system_messages = [msg for msg in self.conversation_history if msg["role"] == "system"]
-            if system_messages:
-                # 保留第一条 system 消息
-                system_message = system_messages[0]
-                self.conversation_history = [system_message] + self.conversation_history[-self.max_history_length * 2 + 1:]
+        # 显示用户消息（自己发送的消息总是滚动到底部）
+        self.display_message("User", user_message, len(self.conversation_history) - 1)
+        self.transcript.scroll_to_end()
+
+        self.start_request(user_message, history_before)
+
+    def start_request(self, user_message, history_before, use_cache=True, regenerate=False):
+        """以当前对话历史发起请求；history_before 为停止或失败时回滚到的历史"""
+        # 按 token 预算选取本次发送的上下文（完整历史仍保留在 conversation_history 中）
+        # 模型和温度在主线程读取后随请求传给工作线程
+        model = self.selected_model.get()
+        temperature = self.temperature_options[self.selected_temperature.get()]
+        request = ChatRequest(user_message, self.build_request_messages(model), history_before, model, temperature,
+                              use_cache, regenerate)
+        self.active_request = request
+        self.stop_button.config(state='normal')
+        # 显示加载指示器
+        self.show_loading("正在处理请求，请稍候...")
+
+        # 启动一个新线程来处理API请求
+        threading.Thread(target=self.get_deepseek_response_thread, args=(request,), daemon=True).start()
+
+    def build_request_messages(self, model):
+        """按 token 预算选取本次请求的上下文：保留系统提示词和最新的若干轮对话"""
+        context_tokens = get_context_tokens(model, self.context_tokens)
+        budget = get_prompt_budget(context_tokens, self.max_tokens)
+        if self.auto_summary:
+            budget -= SUMMARY_MAX_TOKENS  # 为早期对话摘要预留空间
+        messages, dropped = self.context_window.build(self.conversation_history, budget, self.max_history_length * 2)
+        if dropped:
+            print(f"上下文超出预算，省略了 {dropped} 条早期消息（预算 {budget} tokens）")
+            if self.auto_summary:
+                messages = self.attach_summary(messages, dropped)
+        return messages
+
+    def attach_summary(self, messages, dropped):
+        """在上下文开头插入被省略早期对话的摘要；摘要尚未覆盖全部省略内容时安排后台更新"""
+        history = self.conversation_history
+        body = history[1:] if history and history[0]["role"] == "system" else history
+        dropped_messages = body[:dropped]
+        end, summary = self.summary_store.find(dropped_messages)
+        if end < dropped:
+            self.summary_worker.schedule(self.summary_store, dropped_messages)
+        if not summary:
+            return messages
+        if messages and messages[0]["role"] == "system":
+            return messages[:1] + [build_summary_message(summary)] + messages[1:]
+        return [build_summary_message(summary)] + messages
+
+    def request_summary(self, previous_summary, messages):
+        """调用同一 API 生成滚动摘要（在摘要线程中执行，与正常发送共享连接和限流预算）"""
+        prompt = build_summary_prompt(previous_summary, messages)
+        data = {
+            "model": self.models[0],  # 使用默认的通用模型生成摘要
+            "messages": prompt,
+            "temperature": 0.3,
+            "max_tokens": SUMMARY_MAX_TOKENS
+        }
+        headers = {
+            "Authorization": f"Bearer {self.API_KEY}",
+            "Content-Type": "application/json"
+        }
+        self.rate_limiter_pool.get(self.API_URL).acquire(messages_tokens(prompt))
+        response = self.session_pool.get(self.API_URL).post(self.API_URL, headers=headers, json=data, timeout=300)
+        response.raise_for_status()
+        result = response.json()
+        self.ui.post(self.update_usage_stats, result.get("usage"))
+        return result['choices'][0]['message']['content'].strip()
+
+    def on_summary_ready(self, store):
+        """摘要生成后，若对话已关联历史文件则立即保存摘要缓存"""
+        self.ui.post(self.save_summary_cache, store)
+
+    def save_summary_cache(self, store):
+        """保存摘要缓存（仅当摘要仍属于当前对话时）"""
+        if store is self.summary_store and self.history_file_path and self.history_file_path.endswith(".json"):
+            store.save(self.history_file_path)
+
+    def stop_generation(self):
+        """停止当前进行中的回复：立即断开连接，保留已显示的部分回复并回滚对话历史"""
+        request = self.active_request
+        if request is None:
+            return
+
+        stream_started = request.cancel()
+        self.rollback_request(request)
+        self.finish_request(request)
+        if request.regenerate:
+            # 用户消息仍在历史中，不放回输入框
+            self.display_message("系统", "已停止重新生成，已恢复原来的回复")
+            return
+
+        # 将本轮用户消息放回输入框，便于修改后重新发送
+        if not self.user_input.get("1.0", tk.END).strip():
+            self.user_input.insert(tk.END, request.user_message)
+
+        # 已开始显示回复时，由工作线程收尾后再提示，保证提示位于部分回复之后
+        if not stream_started:
+            self.display_message("系统", "已停止生成，本轮对话未计入历史，消息已放回输入框")
+
+    def rollback_request(self, request):
+        """停止或失败时把对话历史回滚到请求之前；重新生成时删除新回复的显示并恢复原来的回复"""
+        self.conversation_history = request.history_before
+        self.journal.record(self.conversation_history)
+        if request.regenerate:
+            index = len(self.conversation_history) - 1
+            self.transcript.truncate(index)
+            self.display_message("Assistant", self.conversation_history[index]["content"], index)
+
+    def finish_request(self, request):
+        """请求结束（完成、失败或停止）后释放发送状态"""
+        if self.active_request is request:
+            self.active_request = None
+            self.stop_button.config(state='disabled')
+            self.hide_loading()
+
+    def complete_request(self, request, ai_response, display, cached=False):
+        """在主线程中提交AI回复；cached 表示回复来自本地响应缓存"""
+        if request.cancelled:
+            # 回复在点击停止之前已完整显示（重新生成时原回复已在停止时恢复）
+            if not display and not request.regenerate:
+                # 工作线程可能已在停止前结束了流式显示，只结束仍未结束的消息
+                if self.transcript.streaming:
+                    self.end_stream_message()
+                self.display_message("系统", "已停止生成，已保留回复内容（未计入历史），消息已放回输入框")
+            return
+
+        self.conversation_history.append({"role": "assistant", "content": ai_response})
+        self.journal.record(self.conversation_history)
+        self.finish_request(request)
+        if cached:
+            self.display_message(f"{request.model} [缓存]", ai_response, len(self.conversation_history) - 1)
+            self.show_popup(ai_response)
+        elif display:
+            # 非流式回复：显示到聊天窗口并弹出
+            self.display_message(request.model, ai_response, len(self.conversation_history) - 1)
+            self.show_popup(ai_response)
+
+    def fail_request(self, request, error_details):
+        """在主线程中处理请求失败：回滚对话历史并显示错误"""
+        if request.cancelled:
+            return
+
+        # 如果API调用失败，移除本轮用户消息（重新生成时恢复原回复）
+        self.rollback_request(request)
+        self.finish_request(request)
+        self.display_message("系统", error_details)
+
+    def on_request_stopped(self, request):
+        """工作线程在停止后收尾：结束部分回复的显示并提示（重新生成时部分回复已在停止时删除）"""
+        if request.stream_started and not request.regenerate:
+            self.end_stream_message()
+            self.display_message("系统", "已停止生成，已保留部分回复（未计入历史），消息已放回输入框")
+
+    def get_deepseek_response_thread(self, request):
+        """工作线程入口：未预料的异常（如响应结构异常）也交给主线程结束请求，避免界面一直处于发送中"""
+        try:
+            self.request_reply(request)
+        except Exception as e:
+            print(f"处理请求时出错: {type(e).__name__}: {str(e)}")
+            if request.cancelled:
+                self.ui.post(self.on_request_stopped, request)
             else:
-                # 如果没有 system 消息，删除历史后重新添加 system_prompt
-                self.conversation_history = self.conversation_history[-self.max_history_length * 2:]
-                self.conversation_history.insert(0, {"role": "system", "content": self.system_prompt})
+                self.ui.post(self.fail_request, request, f"处理API响应时出错\n错误类型: {type(e).__name__}\n详细信息: {str(e)}")
 
+    def request_reply(self, request):
+        """在新线程中调用DeepSeek API获取回复"""
         headers = {
             "Authorization": f"Bearer {self.API_KEY}",
             "Content-Type": "application/json"
         }
         # 根据选择的模型调整参数
-        model = self.selected_model.get()
+        model = request.model
         if model == "deepseek-reasoner":
             data = {
                 "model": model,
-                "messages": self.conversation_history,
+                "messages": request.messages,
                 "max_tokens": self.max_tokens
             }
         else:  # deepseek-chat
             data = {
                 "model": model,
-                "messages": self.conversation_history,
-                "temperature": self.temperature_options[self.selected_temperature.get()],
+                "messages": request.messages,
+                "temperature": request.temperature,
                 "max_tokens": self.max_tokens
             }
+        # 确定性请求（温度为 0）先查本地响应缓存，命中时直接返回，不占用限流预算
+        cache_key = ResponseCache.make_key(self.API_URL, data) if self.response_cache_enabled else None
+        if cache_key and request.use_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                if cached.get("reasoning"):
+                    self.ui.post(self.show_think_text, cached["reasoning"])
+                self.ui.post(self.complete_request, request, cached["content"], True, True)
+                return
 
-        # 重试机制
-        max_retries = 3
+        # 流式输出：逐块接收回复，首个 token 到达即可显示
+        if self.stream_enabled:
+            data["stream"] = True
+            data["stream_options"] = {"include_usage": True}
 
-        for attempt in range(max_retries):
+        # 重试机制：请求数据在各次尝试间保持不变，对话历史只在成功后由主线程提交
+        retry_policy = RetryPolicy(self.max_retries, self.retry_backoff, jitter=self.retry_jitter)
+        attempt_log = []  # 记录每次尝试的结果和耗时
+        # 预估本次请求的 prompt token 数，用于 TPM 限流
+        estimated_tokens = messages_tokens(request.messages)
+
+        for attempt in range(retry_policy.max_attempts):
+            attempt_start = time.time()
             try:
-                # 移除超时限制
-                response = requests.post(self.API_URL, headers=headers, json=data, timeout=None)
+                # 客户端限流：超出预算时排队等待发送名额，而不是直接触发服务端 429
+                if not self.wait_for_rate_limit(request, estimated_tokens):
+                    raise RequestCancelled()
+
+                # 移除超时限制；始终以 stream=True 延迟读取响应体，使“停止”可以随时断开连接
+                session = self.session_pool.get(self.API_URL)
+                response = session.post(self.API_URL, headers=headers, json=data, timeout=None, stream=True)
+                request.attach(response)
                 response.raise_for_status()
-                
+                attempt_log.append(f"第 {attempt + 1} 次: 成功，响应头耗时 {time.time() - attempt_start:.2f} 秒")
+                if attempt > 0:
+                    self.ui.post(self.display_message, "系统", "请求重试后成功\n" + "\n".join(attempt_log))
+
+                if self.stream_enabled:
+                    accumulator = self.read_stream_response(response, request)
+                    print("API 响应:", accumulator.usage)
+                    self.record_usage(accumulator.usage, estimated_tokens)
+                    if cache_key and accumulator.finish_reason == "stop":
+                        self.response_cache.put(cache_key, {"content": accumulator.content, "reasoning": accumulator.reasoning})
+                    self.ui.post(self.complete_request, request, accumulator.content, not request.stream_started)
+                    return
+
                 #检查传参
                 # print("temperature:",data["temperature"])
                 # print("max_tokens:",data["max_tokens"])
                 print("API 响应:", response.json()['usage']) 
+                self.record_usage(response.json()['usage'], estimated_tokens)
                 #print("API 响应:", response.json()) 
 
                 #如果有reasoning_content，显示在弹出窗口
                 think_response = response.json()['choices'][0].get('message', {})
                 if 'reasoning_content' in think_response:
-                    self.root.after(0,self.show_popup,think_response['reasoning_content'],'最新think') 
+                    self.ui.post(self.show_think_text, think_response['reasoning_content'])
+                    self.ui.post(self.show_popup, think_response['reasoning_content'],'最新think') 
 
                 ai_response = response.json()['choices'][0]['message']['content']                               
-                self.conversation_history.append({"role": "assistant", "content": ai_response})
-                self.hide_loading()
-                # 在主线程中显示AI回复
-                self.root.after(0, self.display_message, self.selected_model.get(), ai_response)
+                if cache_key and response.json()['choices'][0].get('finish_reason') == "stop":
+                    self.response_cache.put(cache_key, {"content": ai_response, "reasoning": think_response.get('reasoning_content', "")})
+                # 在主线程中提交并显示AI回复
+                self.ui.post(self.complete_request, request, ai_response, True)
                 return
 
+            except RequestCancelled:
+                self.ui.post(self.on_request_stopped, request)
+                return
             except requests.exceptions.RequestException as e:
-                # 如果API调用失败，移除最后一条用户消息
-                self.conversation_history.pop()
-                self.hide_loading()
+                # 停止时主动断开连接引起的异常，按停止处理
+                if request.cancelled:
+                    self.ui.post(self.on_request_stopped, request)
+                    return
+
+                status = e.response.status_code if getattr(e, 'response', None) is not None else type(e).__name__
+                attempt_log.append(f"第 {attempt + 1} 次: 失败({status})，耗时 {time.time() - attempt_start:.2f} 秒")
+                print(attempt_log[-1])
+
+                # 已开始显示回复时不再重试，避免重复输出
+                if not request.stream_started and retry_policy.should_retry(e, attempt):
+                    delay = retry_policy.get_delay(attempt, e)
+                    if getattr(e, 'response', None) is not None:
+                        e.response.close()  # 释放失败响应占用的连接
+                    self.ui.post(self.set_loading_note, request,
+                        f"第 {attempt + 1} 次请求失败({status})，{delay:.1f} 秒后重试…")
+                    # 等待期间点击“停止”可立即结束
+                    if request.cancel_event.wait(delay):
+                        self.ui.post(self.on_request_stopped, request)
+                        return
+                    self.ui.post(self.set_loading_note, request, f"正在进行第 {attempt + 1} 次重试…")
+                    continue
 
                 # 获取更多错误详情
                 error_details = str(e)
@@ -832,33 +1255,90 @@ class DeepSeekChatApp:
                     # 如果没有 response，说明服务器响应为空
                     error_details = f"服务器响应为空(请求未到达服务器或服务器出现异常): {str(e)}"
 
-                self.root.after(0, self.display_message, "系统", 
+                self.ui.post(self.fail_request, request,
                     f"API请求失败\n"
                     f"错误类型: {type(e).__name__}\n"
                     f"详细信息:\n{error_details}\n"
+                    f"尝试记录:\n" + "\n".join(attempt_log) + "\n"
                     f"请检查网络连接和API配置后重试")
 
                 return
             except (KeyError, ValueError, json.JSONDecodeError) as e:
-                self.conversation_history.pop()
-                self.hide_loading()
+                if request.cancelled:
+                    self.ui.post(self.on_request_stopped, request)
+                    return
                 # 如果是 JSONDecodeError，打印原始响应内容
                 if isinstance(e, json.JSONDecodeError):
                     raw_response = e.response.text[:2000] if hasattr(e, 'response') and e.response is not None else "无响应内容"
                     error_details = f"解析JSON失败: {str(e)}\n原始响应内容: {raw_response}"
                 else:
                     error_details = f"解析API响应失败: {str(e)}"
-                self.root.after(0, self.display_message, "系统", error_details)
+                self.ui.post(self.fail_request, request, error_details)
                 return
 
-
+    def wait_for_rate_limit(self, request, tokens):
+        """按当前 API_URL 的 RPM/TPM 预算排队等待发送名额，并在加载指示器上显示剩余等待时间"""
+        limiter = self.rate_limiter_pool.get(self.API_URL)
+        waited = False
+
+        def on_wait(wait, position):
+            nonlocal waited
+            waited = True
+            queue_note = f"（前面还有 {position} 个请求）" if position else ""
+            self.ui.post(self.set_loading_note, request,
+                f"已达到客户端速率限制{queue_note}，约 {wait:.0f} 秒后发送…")
+
+        acquired = limiter.acquire(tokens, request.cancel_event, on_wait)
+        if acquired and waited:
+            self.ui.post(self.set_loading_note, request, "")
+        return acquired
+
+    def record_usage(self, usage, estimated_tokens):
+        """记录实际 token 用量：更新本对话的用量统计，并修正限流预算"""
+        self.ui.post(self.update_usage_stats, usage)
+        if usage and usage.get("total_tokens"):
+            self.rate_limiter_pool.get(self.API_URL).record_usage(usage["total_tokens"] - estimated_tokens)
+
+    def read_stream_response(self, response, request):
+        """逐个解析 SSE 事件，并在主线程中增量显示回复，返回累积结果"""
+        accumulator = StreamAccumulator()
+        sender = request.model
+        thinking = False
+        completed = False
+        try:
+            for event in iter_sse_events(response):
+                reasoning, content = accumulator.feed(event)
+                if reasoning:
+                    # 思考过程实时显示到思考面板，便于及早发现思路跑偏
+                    if not thinking:
+                        self.ui.post(self.begin_think_message)
+                        thinking = True
+                    self.ui.post_text(self.append_think_text, reasoning)
+                if content:
+                    if not request.stream_started:
+                        if not request.mark_stream_started():
+                            raise RequestCancelled()
+                        self.ui.post(self.begin_stream_message, sender)
+                    self.ui.post_text(self.append_stream_text, content)
+            completed = True
+        except Exception:
+            # 停止时连接被主动断开，读取中断引起的异常统一按停止处理
+            if request.cancelled:
+                raise RequestCancelled() from None
+            raise
+        finally:
+            response.close()
+            if request.stream_started and not request.cancelled:
+                # 出错时只结束当前消息的显示，不弹出不完整的回复
+                self.ui.post(self.end_stream_message, accumulator.content if completed else None)
+        return accumulator
 
 
     def open_settings(self):
         """打开设置窗口"""
         self.settings_window = tk.Toplevel(self.root)
         self.settings_window.title("设置")
-        self.settings_window.geometry("400x300")
+        self.settings_window.geometry("400x840")
 
         # 使用 grid 布局
         self.settings_window.grid_columnconfigure(1, weight=1)
@@ -887,9 +1367,80 @@ class DeepSeekChatApp:
         self.max_tokens_entry.grid(row=3, column=1, padx=10, pady=10, sticky="ew")
         self.max_tokens_entry.insert(0, str(self.max_tokens))  # 显示当前最大 Token 数
 
+        # 添加上下文 Token 上限输入框（0 表示按模型自动确定）
+        tk.Label(self.settings_window, text="上下文Token上限:").grid(row=4, column=0, padx=10, pady=10, sticky="w")
+        self.context_tokens_entry = ttk.Entry(self.settings_window, width=40)
+        self.context_tokens_entry.grid(row=4, column=1, padx=10, pady=10, sticky="ew")
+        self.context_tokens_entry.insert(0, str(self.context_tokens))
+
+        # 添加上下文裁剪方式选择
+        tk.Label(self.settings_window, text="上下文裁剪方式:").grid(row=5, column=0, padx=10, pady=10, sticky="w")
+        self.trim_mode_options = {"成块裁剪（利于命中前缀缓存）": "block", "滑动窗口": "sliding"}
+        trim_mode_names = {mode: name for name, mode in self.trim_mode_options.items()}
+        self.trim_mode_var = tk.StringVar(value=trim_mode_names.get(self.trim_mode, "成块裁剪（利于命中前缀缓存）"))
+        ttk.Combobox(self.settings_window, textvariable=self.trim_mode_var, values=list(self.trim_mode_options.keys()), state="readonly").grid(row=5, column=1, padx=10, pady=10, sticky="ew")
+
+        # 添加最大重试次数输入框
+        tk.Label(self.settings_window, text="最大重试次数:").grid(row=6, column=0, padx=10, pady=10, sticky="w")
+        self.max_retries_entry = ttk.Entry(self.settings_window, width=40)
+        self.max_retries_entry.grid(row=6, column=1, padx=10, pady=10, sticky="ew")
+        self.max_retries_entry.insert(0, str(self.max_retries))
+
+        # 添加重试退避基数输入框（秒，每次重试等待时间翻倍）
+        tk.Label(self.settings_window, text="重试退避(秒):").grid(row=7, column=0, padx=10, pady=10, sticky="w")
+        self.retry_backoff_entry = ttk.Entry(self.settings_window, width=40)
+        self.retry_backoff_entry.grid(row=7, column=1, padx=10, pady=10, sticky="ew")
+        self.retry_backoff_entry.insert(0, str(self.retry_backoff))
+
+        # 添加重试抖动比例输入框（0~1）
+        tk.Label(self.settings_window, text="重试抖动(0~1):").grid(row=8, column=0, padx=10, pady=10, sticky="w")
+        self.retry_jitter_entry = ttk.Entry(self.settings_window, width=40)
+        self.retry_jitter_entry.grid(row=8, column=1, padx=10, pady=10, sticky="ew")
+        self.retry_jitter_entry.insert(0, str(self.retry_jitter))
+
+        # 添加当前 API URL 的限流预算输入框（0 表示不限制）
+        limits = self.rate_limits.get(self.API_URL, {})
+        tk.Label(self.settings_window, text="每分钟请求数:").grid(row=9, column=0, padx=10, pady=10, sticky="w")
+        self.rpm_entry = ttk.Entry(self.settings_window, width=40)
+        self.rpm_entry.grid(row=9, column=1, padx=10, pady=10, sticky="ew")
+        self.rpm_entry.insert(0, str(limits.get("rpm", 0)))
+
+        tk.Label(self.settings_window, text="每分钟Token数:").grid(row=10, column=0, padx=10, pady=10, sticky="w")
+        self.tpm_entry = ttk.Entry(self.settings_window, width=40)
+        self.tpm_entry.grid(row=10, column=1, padx=10, pady=10, sticky="ew")
+        self.tpm_entry.insert(0, str(limits.get("tpm", 0)))
+
+        # 添加流式输出开关
+        self.stream_var = tk.BooleanVar(value=self.stream_enabled)
+        ttk.Checkbutton(self.settings_window, text="流式输出（逐字显示回复）", variable=self.stream_var).grid(row=11, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        # 添加自动摘要开关
+        self.auto_summary_var = tk.BooleanVar(value=self.auto_summary)
+        ttk.Checkbutton(self.settings_window, text="自动摘要超出上下文的早期对话", variable=self.auto_summary_var).grid(row=12, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        # 添加响应缓存设置
+        self.response_cache_var = tk.BooleanVar(value=self.response_cache_enabled)
+        ttk.Checkbutton(self.settings_window, text="缓存确定性回复（场景温度为 0 时）", variable=self.response_cache_var).grid(row=13, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        tk.Label(self.settings_window, text="缓存有效期(小时):").grid(row=14, column=0, padx=10, pady=10, sticky="w")
+        self.cache_ttl_entry = ttk.Entry(self.settings_window, width=40)
+        self.cache_ttl_entry.grid(row=14, column=1, padx=10, pady=10, sticky="ew")
+        self.cache_ttl_entry.insert(0, str(self.cache_ttl_hours))
+
+        tk.Label(self.settings_window, text="缓存上限(MB):").grid(row=15, column=0, padx=10, pady=10, sticky="w")
+        self.cache_max_entry = ttk.Entry(self.settings_window, width=40)
+        self.cache_max_entry.grid(row=15, column=1, padx=10, pady=10, sticky="ew")
+        self.cache_max_entry.insert(0, str(self.cache_max_mb))
+
+        # 添加回复弹窗数量上限（0 表示不弹出回复窗口）
+        tk.Label(self.settings_window, text="回复弹窗上限(0为关闭):").grid(row=16, column=0, padx=10, pady=10, sticky="w")
+        self.reply_viewer_entry = ttk.Entry(self.settings_window, width=40)
+        self.reply_viewer_entry.grid(row=16, column=1, padx=10, pady=10, sticky="ew")
+        self.reply_viewer_entry.insert(0, str(self.reply_viewer_limit))
+
         # 添加保存按钮
         save_button = tk.Button(self.settings_window, text="保存", command=self.save_settings, width=10)
-        save_button.grid(row=4, column=0, columnspan=2, pady=20)
+        save_button.grid(row=17, column=0, columnspan=2, pady=20)
 
     def save_settings(self):
         """保存设置"""
@@ -899,26 +1450,69 @@ class DeepSeekChatApp:
             new_api_key = self.api_key_entry.get().strip()
             new_max_history = int(self.max_history_entry.get().strip())
             new_max_tokens = int(self.max_tokens_entry.get().strip())
+            new_context_tokens = int(self.context_tokens_entry.get().strip())
+            new_max_retries = int(self.max_retries_entry.get().strip())
+            new_retry_backoff = float(self.retry_backoff_entry.get().strip())
+            new_retry_jitter = float(self.retry_jitter_entry.get().strip())
+            new_rpm = int(self.rpm_entry.get().strip())
+            new_tpm = int(self.tpm_entry.get().strip())
+            new_cache_ttl = float(self.cache_ttl_entry.get().strip())
+            new_cache_max = float(self.cache_max_entry.get().strip())
+            new_reply_viewer_limit = int(self.reply_viewer_entry.get().strip())
+
+            # API URL 变化时预热新地址的连接
+            if new_api_url != self.API_URL:
+                self.session_pool.warm_up(new_api_url)
 
             # 更新实例变量
             self.API_URL = new_api_url
             self.API_KEY = new_api_key
             self.max_history_length = new_max_history
             self.max_tokens = new_max_tokens
+            self.context_tokens = new_context_tokens
+            self.trim_mode = self.trim_mode_options[self.trim_mode_var.get()]
+            if self.trim_mode != self.context_window.mode:
+                self.context_window = ContextWindow(self.trim_mode)
+            self.stream_enabled = self.stream_var.get()
+            self.auto_summary = self.auto_summary_var.get()
+            self.max_retries = new_max_retries
+            self.retry_backoff = new_retry_backoff
+            self.retry_jitter = new_retry_jitter
+            # 限流预算按 API URL 分别保存
+            self.rate_limits[self.API_URL] = {"rpm": new_rpm, "tpm": new_tpm}
+            self.rate_limiter_pool.configure(self.API_URL, new_rpm, new_tpm)
+            self.response_cache_enabled = self.response_cache_var.get()
+            self.cache_ttl_hours = new_cache_ttl
+            self.cache_max_mb = new_cache_max
+            self.response_cache.configure(int(new_cache_max * 1024 * 1024), int(new_cache_ttl * 3600))
+            self.reply_viewer_limit = new_reply_viewer_limit
+            self.reply_viewers.configure(new_reply_viewer_limit)
 
             # 保存配置到文件
             save_config({
                 "API_URL": self.API_URL,
                 "API_KEY": self.API_KEY,
                 "max_history_length": self.max_history_length,
-                "max_tokens": self.max_tokens
+                "max_tokens": self.max_tokens,
+                "context_tokens": self.context_tokens,
+                "trim_mode": self.trim_mode,
+                "stream": self.stream_enabled,
+                "auto_summary": self.auto_summary,
+                "max_retries": self.max_retries,
+                "retry_backoff": self.retry_backoff,
+                "retry_jitter": self.retry_jitter,
+                "rate_limits": self.rate_limits,
+                "response_cache": self.response_cache_enabled,
+                "cache_ttl_hours": self.cache_ttl_hours,
+                "cache_max_mb": self.cache_max_mb,
+                "reply_viewer_limit": self.reply_viewer_limit
             },self.CONFIG_FILE)
 
             # 显示成功消息
             messagebox.showinfo("成功", "设置已保存")
             self.settings_window.destroy()  # 关闭设置窗口
         except ValueError:
-            messagebox.showerror("错误", "请输入有效的数字（最大历史记录长度和最大 Token 数必须为整数）")
+            messagebox.showerror("错误", "请输入有效的数字（最大历史记录长度、Token 数、重试次数、限流预算和弹窗上限必须为整数）")
 
     def open_prompts_manager(self):
         """打开 Prompts 管理界面"""
@@ -948,7 +1542,16 @@ class DeepSeekChatApp:
             if save:  # 用户选择保存
                 if not self.save_history():  # 如果保存失败或取消
                     return  # 不关闭窗口
+        # 正常退出：不再需要恢复，删除对话日志及本次会话自动保存的历史文件
+        self.journal.close(discard=True)
         # 关闭窗口
+        self.history_watcher.stop()
+        self.prompts_watcher.stop()
+        self.ui.stop()
+        self.highlighter.close()
+        self.session_pool.close()
+        self.response_cache.close()
+        self.history_store.close()
         self.root.destroy()
 
 
@@ -959,7 +1562,19 @@ if __name__ == "__main__":
         "API_URL": "https://api.deepseek.com/chat/completions",
         "API_KEY": "youapi",
         "max_history_length": 100,
-        "max_tokens": 8000 
+        "max_tokens": 8000,
+        "context_tokens": 0,
+        "trim_mode": "block",
+        "stream": True,
+        "auto_summary": True,
+        "max_retries": 3,
+        "retry_backoff": 1.0,
+        "retry_jitter": 0.5,
+        "rate_limits": {},
+        "response_cache": False,
+        "cache_ttl_hours": 168,
+        "cache_max_mb": 50,
+        "reply_viewer_limit": 2
     }
 
     root = tk.Tk()
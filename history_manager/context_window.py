@@ -0,0 +1,134 @@
+from functools import lru_cache
+
+
+# 各模型的上下文长度（token），未列出的模型使用 DEFAULT_CONTEXT_TOKENS
+MODEL_CONTEXT_TOKENS = {
+    "deepseek-chat": 65536,
+    "deepseek-reasoner": 65536,
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "o1": 200000,
+    "o1-mini": 128000,
+    "o3": 200000,
+    "o3-mini": 200000,
+}
+DEFAULT_CONTEXT_TOKENS = 65536
+
+# 每条消息在角色、分隔符等格式上的额外开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_tokens(text):
+    """快速估算文本的 token 数（不缓存，用于只计算一次的文本，如批量索引历史文件）：
+    中文等宽字符约 0.6 token/字，其余字符约 0.3 token/字符"""
+    if not text:
+        return 0
+    # 利用 UTF-8 编码长度推算宽字符数量（ASCII 占 1 字节，中文占 3 字节），计算在 C 层完成
+    char_count = len(text)
+    wide_count = (len(text.encode('utf-8', errors='replace')) - char_count) // 2
+    narrow_count = max(char_count - wide_count, 0)
+    return int(wide_count * 0.6 + narrow_count * 0.3) + 1
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text):
+    """估算文本的 token 数，结果按文本缓存，同一条消息只需计算一次"""
+    return count_tokens(text)
+
+
+def message_tokens(message):
+    """估算单条消息的 token 数"""
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def messages_tokens(messages):
+    """估算消息列表的 token 总数"""
+    return sum(message_tokens(msg) for msg in messages)
+
+
+def get_context_tokens(model, override=0):
+    """获取模型的上下文长度，override 大于 0 时以其为准"""
+    if override and override > 0:
+        return override
+    return MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+
+
+def get_prompt_budget(context_tokens, max_tokens, safety_ratio=0.95):
+    """计算可用于发送历史的 token 预算：上下文长度减去为回复预留的 max_tokens"""
+    # 估算并不精确，只使用 safety_ratio 比例的预算；max_tokens 过大时至少保留四分之一上下文
+    budget = max(context_tokens - max_tokens, context_tokens // 4)
+    return int(budget * safety_ratio)
+
+
+def build_context(history, budget, max_messages=None):
+    """按 token 预算从最新的消息向前选取上下文，返回 (发送的消息列表, 被省略的早期消息数)"""
+    # 始终保留开头的 system 消息；最新的一条消息即使超出预算也会保留
+    if history and history[0]["role"] == "system":
+        system_messages, body = history[:1], history[1:]
+    else:
+        system_messages, body = [], history
+
+    used = messages_tokens(system_messages)
+    start = len(body)
+    while start > 0:
+        if max_messages and len(body) - start >= max_messages:
+            break
+        cost = message_tokens(body[start - 1])
+        if used + cost > budget and start < len(body):
+            break
+        used += cost
+        start -= 1
+
+    # 上下文从用户消息开始，避免以半轮对话（孤立的 AI 回复）开头
+    while start < len(body) - 1 and body[start]["role"] != "user":
+        start += 1
+
+    return system_messages + body[start:], start
+
+
+class ContextWindow:
+    """维护上下文窗口的起点，支持滑动窗口和成块裁剪两种方式"""
+
+    # "sliding"：每轮都按预算重新选取，超出预算后窗口起点每轮都会前移；
+    # "block"：超出预算时一次性成块丢弃旧对话，之后多轮内起点保持不变，请求前缀逐字节一致，
+    #          可以持续命中服务端的前缀缓存（DeepSeek 对缓存命中部分按低价计费）
+    MODES = ("block", "sliding")
+
+    def __init__(self, mode="block", block_ratio=0.5):
+        self.mode = mode if mode in self.MODES else "block"
+        self.block_ratio = block_ratio  # 成块裁剪时，一次性压缩到预算的这一比例
+        self.start = 0  # 窗口起点（不含开头 system 消息的下标）
+
+    def reset(self):
+        """对话被替换（加载、清空）后重置窗口起点"""
+        self.start = 0
+
+    def build(self, history, budget, max_messages=None):
+        """选取本次发送的上下文，返回 (发送的消息列表, 被省略的早期消息数)"""
+        if self.mode == "sliding":
+            messages, self.start = build_context(history, budget, max_messages)
+            return messages, self.start
+
+        if history and history[0]["role"] == "system":
+            system_messages, body = history[:1], history[1:]
+        else:
+            system_messages, body = [], history
+
+        # 对话被撤回或回滚到起点之前时，重新计算窗口
+        if self.start >= len(body):
+            self.start = 0
+
+        window = body[self.start:]
+        over_budget = messages_tokens(system_messages) + messages_tokens(window) > budget
+        over_count = bool(max_messages) and len(window) > max_messages
+        if over_budget or over_count:
+            # 一次前移一大块，为后续多轮对话留出余量
+            block_budget = int(budget * self.block_ratio)
+            block_messages = max(int(max_messages * self.block_ratio), 1) if max_messages else None
+            _, new_start = build_context(history, block_budget, block_messages)
+            self.start = max(self.start, new_start)
+
+        return system_messages + body[self.start:], self.start
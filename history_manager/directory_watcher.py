@@ -0,0 +1,68 @@
+import os
+import threading
+
+
+class DirectoryWatcher:
+    """轮询式目录监视：后台线程定期比较目录中文件的修改时间和大小，只把新增、修改、删除的文件报告给回调。
+    目录本身的修改时间未变化时跳过遍历（新增、删除、替换文件都会更新目录的修改时间），
+    每隔若干轮再完整检查一次，以发现原地写入的修改"""
+
+    def __init__(self, directory, on_change, suffix=".json", interval=2.0, full_scan_every=5):
+        self.directory = directory
+        self.on_change = on_change  # on_change(新增, 修改, 删除)，均为文件名列表，在监视线程中调用
+        self.suffix = suffix
+        self.interval = interval  # 轮询间隔（秒）
+        self.full_scan_every = full_scan_every  # 每隔多少轮无论目录修改时间是否变化都完整检查一次
+        self.snapshot = None  # {文件名: (修改时间, 大小)}，首次遍历完成后可用；每次遍历整体替换，可在其他线程读取
+        self._dir_mtime = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动监视线程，首次遍历只建立基准，不报告变化"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止监视"""
+        self._stop.set()
+
+    def scan(self):
+        """遍历一次目录，与上次的结果比较，返回 (新增, 修改, 删除)"""
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.suffix) and entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_mtime, stat.st_size)
+        previous = self.snapshot or {}
+        added = [name for name in snapshot if name not in previous]
+        modified = [name for name, state in snapshot.items() if name in previous and previous[name] != state]
+        removed = [name for name in previous if name not in snapshot]
+        self.snapshot = snapshot
+        return added, modified, removed
+
+    def _run(self):
+        ticks = 0
+        try:
+            self._dir_mtime = os.stat(self.directory).st_mtime_ns
+            self.scan()
+        except OSError as e:
+            print(f"监视目录失败 {self.directory}: {str(e)}")
+        while not self._stop.wait(self.interval):
+            ticks += 1
+            try:
+                dir_mtime = os.stat(self.directory).st_mtime_ns
+                if dir_mtime == self._dir_mtime and ticks % self.full_scan_every:
+                    continue
+                self._dir_mtime = dir_mtime
+                added, modified, removed = self.scan()
+            except OSError as e:
+                print(f"监视目录失败 {self.directory}: {str(e)}")
+                continue
+            if added or modified or removed:
+                try:
+                    self.on_change(added, modified, removed)
+                except Exception as e:
+                    print(f"处理目录变化失败 {self.directory}: {str(e)}")
@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+
+from history_manager.context_window import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+
+# 索引结构版本，结构变化时重建索引（索引可随时由 JSON 文件重新生成）
+SCHEMA_VERSION = 3
+# 预览显示的最后几条消息及每条的字符数
+PREVIEW_MESSAGES = 10
+PREVIEW_CHARS = 100
+# 搜索结果摘要中命中文本的起止标记
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+
+class HistoryStore:
+    """历史对话的 SQLite 索引：以 history/ 下的 JSON 文件为准，按修改时间和大小增量同步，用 FTS5 全文检索消息内容；
+    同时保存每个对话的元数据（标题、消息数、token 估算和预览片段），浏览历史时无需解析整个文件"""
+
+    def __init__(self, path="cache/history_index.db"):
+        self.path = path
+        self.trigram = True  # 是否使用 trigram 分词（支持中文等不以空格分词的文本的子串检索）
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """首次使用时再打开数据库，结构版本不一致时重建"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS files")
+                conn.execute("DROP TABLE IF EXISTS messages")
+            conn.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL, "
+                         "title TEXT, message_count INTEGER, tokens INTEGER, preview TEXT)")
+            try:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+                             "content, name UNINDEXED, position UNINDEXED, role UNINDEXED, tokenize='trigram')")
+            except sqlite3.OperationalError:
+                # SQLite 3.34 之前没有 trigram 分词器，退回默认分词（中文只能整句匹配，短词改用 LIKE）
+                self.trigram = False
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+                             "content, name UNINDEXED, position UNINDEXED, role UNINDEXED)")
+            else:
+                sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'messages'").fetchone()[0]
+                self.trigram = "trigram" in sql
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def sync(self, history_dir, should_stop=None):
+        """与目录中的 JSON 文件同步：只重新索引新增或修改过的文件，删除已不存在的文件，返回变化的文件数"""
+        with self._lock:
+            known = {name: (mtime, size) for name, mtime, size in
+                     self._connect().execute("SELECT name, mtime, size FROM files")}
+        changed = 0
+        with os.scandir(history_dir) as entries:
+            for entry in entries:
+                if should_stop is not None and should_stop():
+                    return changed
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if known.pop(entry.name, None) != (stat.st_mtime, stat.st_size):
+                    self.index_file(entry.path, stat)
+                    changed += 1
+        for name in known:
+            self.remove(name)
+            changed += 1
+        return changed
+
+    def index_file(self, path, stat=None):
+        """重新索引一个历史文件的全部消息和元数据，返回元数据；文件无法解析时只记录修改时间，避免每次同步重复读取"""
+        name = os.path.basename(path)
+        try:
+            stat = stat or os.stat(path)
+            with open(path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+            indexed = [(position, msg) for position, msg in enumerate(history)
+                       if isinstance(msg, dict) and isinstance(msg.get("content"), str)]
+            rows = [(msg["content"], name, position, msg.get("role", "")) for position, msg in indexed
+                    if msg.get("role") != "system"]
+            metadata = build_metadata([msg for _, msg in indexed])
+        except (OSError, ValueError, TypeError) as e:
+            print(f"索引历史文件失败 {name}: {str(e)}")
+            if stat is None:
+                return None
+            rows = []
+            metadata = {"title": "", "message_count": 0, "tokens": 0, "preview": []}
+        metadata.update(name=name, mtime=stat.st_mtime, size=stat.st_size)
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM messages WHERE name = ?", (name,))
+                conn.executemany("INSERT INTO messages (content, name, position, role) VALUES (?, ?, ?, ?)", rows)
+                conn.execute("INSERT OR REPLACE INTO files (name, mtime, size, title, message_count, tokens, preview) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (name, stat.st_mtime, stat.st_size, metadata["title"], metadata["message_count"],
+                              metadata["tokens"], json.dumps(metadata["preview"], ensure_ascii=False)))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"写入历史索引失败: {str(e)}")
+        return metadata
+
+    def list_metadata(self):
+        """一次查询全部对话的元数据 {文件名: 元数据}（不含预览片段）"""
+        try:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT name, mtime, size, title, message_count, tokens FROM files").fetchall()
+        except sqlite3.Error as e:
+            print(f"读取历史索引失败: {str(e)}")
+            return {}
+        return {row[0]: dict(zip(("name", "mtime", "size", "title", "message_count", "tokens"), row))
+                for row in rows}
+
+    def metadata(self, path):
+        """获取一个历史文件的元数据（含预览片段）；索引中的记录与文件的修改时间或大小不一致时重新索引该文件"""
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT title, message_count, tokens, preview FROM files "
+                    "WHERE name = ? AND mtime = ? AND size = ?", (name, stat.st_mtime, stat.st_size)).fetchone()
+        except sqlite3.Error as e:
+            print(f"读取历史索引失败: {str(e)}")
+            row = None
+        if row is None:
+            return self.index_file(path, stat)
+        return {"name": name, "mtime": stat.st_mtime, "size": stat.st_size, "title": row[0], "message_count": row[1],
+                "tokens": row[2], "preview": json.loads(row[3] or "[]")}
+
+    def remove(self, name):
+        """从索引中删除一个历史文件"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM messages WHERE name = ?", (name,))
+                conn.execute("DELETE FROM files WHERE name = ?", (name,))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"删除历史索引失败: {str(e)}")
+
+    def search(self, query, limit=500):
+        """全文检索消息内容，返回 [(文件名, 消息下标, 角色, 摘要)]，按文件名倒序（新的对话在前）；
+        摘要中命中的文本用 MATCH_START/MATCH_END 标出"""
+        query = query.strip()
+        if not query:
+            return []
+        try:
+            with self._lock:
+                conn = self._connect()
+                if len(query) >= 3 or not self.trigram:
+                    phrase = '"' + query.replace('"', '""') + '"'
+                    return conn.execute(
+                        f"SELECT name, position, role, snippet(messages, 0, '{MATCH_START}', '{MATCH_END}', '…', 24) "
+                        "FROM messages WHERE messages MATCH ? ORDER BY name DESC, position LIMIT ?",
+                        (phrase, limit)).fetchall()
+                # trigram 无法匹配少于 3 个字符的词，退回 LIKE 扫描
+                pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                rows = conn.execute(
+                    "SELECT name, position, role, content FROM messages WHERE content LIKE ? ESCAPE '\\' "
+                    "ORDER BY name DESC, position LIMIT ?", (pattern, limit)).fetchall()
+        except sqlite3.Error as e:
+            print(f"检索历史失败: {str(e)}")
+            return []
+        return [(name, position, role, make_snippet(content, query)) for name, position, role, content in rows]
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def build_metadata(messages):
+    """由对话消息生成元数据：标题取第一条用户消息的首行，预览为最后几条消息的开头"""
+    title = next((msg["content"].strip().split("\n")[0][:50] for msg in messages
+                  if msg.get("role") == "user" and msg["content"].strip()), "")
+    return {
+        "title": title,
+        "message_count": sum(1 for msg in messages if msg.get("role") != "system"),
+        # 使用不缓存的估算，批量索引大量历史文件时不占用估算缓存
+        "tokens": sum(count_tokens(msg["content"]) + MESSAGE_OVERHEAD_TOKENS for msg in messages),
+        "preview": [(msg.get("role", ""), msg["content"][:PREVIEW_CHARS]) for msg in messages[-PREVIEW_MESSAGES:]],
+    }
+
+
+def make_snippet(content, query, width=30):
+    """截取命中位置前后的文本作为摘要，并标出命中的部分"""
+    index = content.lower().find(query.lower())
+    if index < 0:
+        return content[:width * 2]
+    start = max(index - width, 0)
+    end = index + len(query)
+    return ("…" if start else "") + content[start:index] + MATCH_START + content[index:end] + MATCH_END + \
+        content[end:end + width] + ("…" if end + width < len(content) else "")
@@ -0,0 +1,173 @@
+import json
+import os
+import queue
+import threading
+import time
+
+
+class ConversationJournal:
+    """当前对话的追加式日志（JSONL）：对话每次变化只追加增量记录，后台线程成批写入并 fsync；
+    记录数达到阈值时把完整对话压缩保存为普通历史文件，日志改为只保留一条指向该文件的快照记录。
+    程序异常退出后，下次启动时可由日志恢复对话"""
+
+    def __init__(self, path, history_dir, sync_interval=1.0, compact_every=50):
+        self.path = path
+        self.history_dir = history_dir
+        self.sync_interval = sync_interval  # 两次 fsync 的最短间隔，期间的记录合并写入
+        self.compact_every = compact_every  # 快照之后累计多少条记录时压缩
+        self.messages = []  # 已记录的对话（消息副本，用于计算增量）
+        self.snapshot_path = None  # 本次会话压缩保存的历史文件
+        self.records = 0  # 日志中快照之后的记录数
+        self._queue = queue.SimpleQueue()  # 写入线程的任务：("lines", [行]) / ("compact", 消息) / ("reset", 行) / None
+        self._closing = threading.Event()
+        self._thread = None
+        self._last_sync = 0.0
+
+    def _post(self, item):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._queue.put(item)
+
+    def record(self, messages):
+        """对话变化后调用：与上次记录的对话比较，只追加截断和新增消息的记录"""
+        previous = self.messages
+        prefix = 0
+        limit = min(len(previous), len(messages))
+        while prefix < limit and previous[prefix] == messages[prefix]:
+            prefix += 1
+        if prefix == len(previous) == len(messages):
+            return
+        lines = []
+        if prefix < len(previous):
+            lines.append(json.dumps({"op": "truncate", "length": prefix}, ensure_ascii=False))
+        for message in messages[prefix:]:
+            lines.append(json.dumps({"op": "append", "message": message}, ensure_ascii=False))
+        self.messages = previous[:prefix] + [dict(message) for message in messages[prefix:]]
+        self.records += len(lines)
+        self._post(("lines", lines))
+        if self.records >= self.compact_every and any(message["role"] != "system" for message in self.messages):
+            self.compact()
+
+    def compact(self):
+        """把完整对话保存为历史文件，并把日志替换为一条快照记录"""
+        if self.snapshot_path is None:
+            name = f"history_{time.strftime('%Y%m%d_%H%M%S')}.json"
+            self.snapshot_path = os.path.join(self.history_dir, name)
+        self.records = 0
+        self._post(("compact", self.snapshot_path, list(self.messages)))
+
+    def new_session(self, messages=()):
+        """对话被清空或替换（加载历史）时开始新的会话：日志整体替换为当前对话，之后压缩到新的历史文件"""
+        self.messages = [dict(message) for message in messages]
+        self.snapshot_path = None
+        self.records = 0
+        self._post(("reset", json.dumps({"op": "reset", "messages": self.messages}, ensure_ascii=False)))
+
+    @staticmethod
+    def recover(path):
+        """读取日志并重放，返回 (对话, 压缩保存的历史文件)；没有日志或日志中没有对话时返回 None。
+        异常退出时最后一行可能不完整，遇到无法解析的行即停止"""
+        if not os.path.exists(path):
+            return None
+        messages, snapshot_path = [], None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    op = record.get("op")
+                    if op == "append":
+                        messages.append(record["message"])
+                    elif op == "truncate":
+                        del messages[record["length"]:]
+                    elif op == "reset":
+                        messages = list(record["messages"])
+                    elif op == "snapshot":
+                        snapshot_path = record["path"]
+                        with open(snapshot_path, "r", encoding="utf-8") as snapshot:
+                            messages = json.load(snapshot)[:record["length"]]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"恢复对话日志失败: {str(e)}")
+            return None
+        if not any(message.get("role") != "system" for message in messages):
+            return None
+        return messages, snapshot_path
+
+    def resume(self, messages, snapshot_path):
+        """从恢复的对话继续记录：日志重写为一条完整记录（丢弃可能不完整的末尾），继续压缩到原来的历史文件"""
+        self.new_session(messages)
+        self.snapshot_path = snapshot_path
+
+    def close(self, discard=False):
+        """正常退出：写完剩余记录并停止写入线程；discard 为 True 时删除日志和本次会话自动保存的历史文件"""
+        if self._thread is not None:
+            self._closing.set()
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+        if discard:
+            for path in (self.path, self.snapshot_path):
+                if path and os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        print(f"删除对话日志失败: {str(e)}")
+
+    def _run(self):
+        """写入线程：距上次 fsync 不足 sync_interval 时先等待，期间到达的记录合并为一次写入和一次 fsync"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                items = [self._queue.get()]
+                delay = self._last_sync + self.sync_interval - time.monotonic()
+                if delay > 0 and items[0] is not None:
+                    self._closing.wait(delay)
+                while True:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = False
+                for item in items:
+                    if item is None:
+                        stop = True
+                    elif item[0] == "lines":
+                        file.write("".join(line + "\n" for line in item[1]))
+                    else:
+                        file.close()
+                        if item[0] == "compact":
+                            self._write_snapshot(item[1], item[2])
+                            line = json.dumps({"op": "snapshot", "path": item[1], "length": len(item[2])},
+                                              ensure_ascii=False)
+                        else:
+                            line = item[1]
+                        self._replace(self.path, line + "\n")
+                        file = open(self.path, "a", encoding="utf-8")
+                file.flush()
+                os.fsync(file.fileno())
+                self._last_sync = time.monotonic()
+                if stop:
+                    return
+        except OSError as e:
+            print(f"写入对话日志失败: {str(e)}")
+        finally:
+            file.close()
+
+    def _write_snapshot(self, path, messages):
+        self._replace(path, json.dumps(messages, ensure_ascii=False, indent=4))
+
+    @staticmethod
+    def _replace(path, content):
+        """先写临时文件并 fsync，再原子替换，中途崩溃时原文件保持完整"""
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+from history_manager.context_window import message_tokens
+
+
+# 摘要回复的最大 token 数，同时也是上下文中为摘要预留的空间
+SUMMARY_MAX_TOKENS = 1024
+
+SUMMARY_SYSTEM_PROMPT = (
+    "你是对话摘要助手。请将给定的对话压缩成简洁的摘要，保留关键事实、用户的需求与偏好、"
+    "已得出的结论、重要的代码或数据细节以及尚未解决的问题。直接输出摘要正文，不超过 800 字。"
+)
+
+
+def build_summary_prompt(previous_summary, messages):
+    """构造摘要请求的消息列表；有已有摘要时把新增对话合并进去（滚动摘要）"""
+    parts = []
+    if previous_summary:
+        parts.append(f"已有摘要：\n{previous_summary}\n\n请将下面的新增对话合并进摘要：")
+    else:
+        parts.append("请总结下面的对话：")
+    for msg in messages:
+        parts.append(f"{msg['role'].capitalize()}: {msg['content']}")
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": "\n\n".join(parts)}
+    ]
+
+
+def build_summary_message(summary):
+    """生成插入到上下文中的摘要消息"""
+    return {"role": "system", "content": f"以下是本次对话早期内容的摘要（原始消息已省略）：\n{summary}"}
+
+
+class SummaryStore:
+    """按被摘要消息范围的哈希缓存摘要，可保存为历史 JSON 旁边的 .summary 文件"""
+
+    def __init__(self):
+        self.summaries = {}  # {范围哈希: {"end": 消息条数, "summary": 摘要}}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def range_hash(messages):
+        """计算消息范围的哈希"""
+        payload = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def sidecar_path(history_path):
+        """历史文件对应的摘要文件路径（不以 .json 结尾，不会出现在历史列表中）"""
+        return os.path.splitext(history_path)[0] + ".summary"
+
+    def find(self, messages):
+        """查找 messages 最长的已摘要前缀，返回 (前缀长度, 摘要)；没有时返回 (0, "")"""
+        with self._lock:
+            ends = sorted({entry["end"] for entry in self.summaries.values() if entry["end"] <= len(messages)}, reverse=True)
+            for end in ends:
+                entry = self.summaries.get(self.range_hash(messages[:end]))
+                if entry:
+                    return end, entry["summary"]
+        return 0, ""
+
+    def put(self, messages, summary):
+        """缓存 messages 范围的摘要"""
+        with self._lock:
+            self.summaries[self.range_hash(messages)] = {"end": len(messages), "summary": summary}
+
+    def load(self, history_path):
+        """读取历史文件旁的摘要缓存"""
+        path = self.sidecar_path(history_path)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                summaries = json.load(file)
+            with self._lock:
+                self.summaries.update(summaries)
+        except Exception as e:
+            print(f"加载对话摘要失败: {str(e)}")
+
+    def save(self, history_path):
+        """将摘要缓存保存到历史文件旁"""
+        with self._lock:
+            if not self.summaries:
+                return
+            summaries = dict(self.summaries)
+        try:
+            with open(self.sidecar_path(history_path), 'w', encoding='utf-8') as file:
+                json.dump(summaries, file, ensure_ascii=False, indent=4)
+        except Exception as e:
+            print(f"保存对话摘要失败: {str(e)}")
+
+
+class SummaryWorker:
+    """后台摘要线程：把超出上下文窗口的早期对话压缩成滚动摘要，不阻塞正常发送"""
+
+    def __init__(self, summarize, on_done=None, chunk_tokens=16000, retry_interval=60):
+        self.summarize = summarize  # summarize(已有摘要, 新增消息) -> 新摘要，在后台线程中调用
+        self.on_done = on_done  # on_done(store) 在每次摘要完成后调用（后台线程）
+        self.chunk_tokens = chunk_tokens  # 单次摘要请求最多包含的对话 token 数
+        self.retry_interval = retry_interval  # 摘要失败后，同一范围至少间隔多少秒再重试
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._failed = {}  # {范围哈希: 失败时间}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def schedule(self, store, messages):
+        """安排为 messages（被省略的早期对话）生成摘要；同一范围只排队一次"""
+        key = store.range_hash(messages)
+        with self._lock:
+            if key in self._pending or time.time() - self._failed.get(key, 0) < self.retry_interval:
+                return
+            self._pending.add(key)
+        self._queue.put((store, list(messages), key))
+
+    def _run(self):
+        while True:
+            store, messages, key = self._queue.get()
+            try:
+                self._summarize_range(store, messages)
+            except Exception as e:
+                print(f"生成对话摘要失败: {str(e)}")
+                with self._lock:
+                    self._failed[key] = time.time()
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+            if self.on_done:
+                self.on_done(store)
+
+    def _summarize_range(self, store, messages):
+        """从已缓存的最长前缀开始，分块把剩余消息合并进摘要"""
+        end, summary = store.find(messages)
+        while end < len(messages):
+            chunk_end, tokens = end, 0
+            while chunk_end < len(messages):
+                cost = message_tokens(messages[chunk_end])
+                if chunk_end > end and tokens + cost > self.chunk_tokens:
+                    break
+                tokens += cost
+                chunk_end += 1
+            summary = self.summarize(summary, messages[end:chunk_end])
+            end = chunk_end
+            # 每块完成后立即缓存，中途失败时下次可从这里继续
+            store.put(messages[:end], summary)
@@ -25,15 +25,48 @@ class PromptsManager:
         if not os.path.exists(self.prompts_dir):
             os.makedirs(self.prompts_dir)
             
-        for filename in os.listdir(self.prompts_dir):
-            if filename.endswith(".json"):
-                file_path = os.path.join(self.prompts_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        prompt_data = json.load(file)
-                        self.prompts.append((filename, prompt_data))
-                except Exception as e:
-                    print(f"加载 {filename} 失败: {str(e)}")
+        filenames = [filename for filename in os.listdir(self.prompts_dir) if filename.endswith(".json")]
+        self.prompts = self.read_prompt_files(filenames)
+
+    def read_prompt_files(self, filenames):
+        """读取若干个 Prompt 文件，返回 [(文件名, 内容)]，读取失败的文件跳过（可在后台线程调用）"""
+        prompts = []
+        for filename in filenames:
+            file_path = os.path.join(self.prompts_dir, filename)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    prompt_data = json.load(file)
+                    prompts.append((filename, prompt_data))
+            except Exception as e:
+                print(f"加载 {filename} 失败: {str(e)}")
+        return prompts
+
+    def apply_changes(self, loaded, removed):
+        """按目录变化增量更新 Prompts：只处理新增、修改和删除的文件，管理窗口打开时同步更新列表"""
+        tree = getattr(self, "tree", None)
+        if tree is not None and not tree.winfo_exists():
+            tree = None
+        removed = set(removed)
+        if removed:
+            self.prompts = [prompt for prompt in self.prompts if prompt[0] not in removed]
+            if tree is not None:
+                for filename in removed:
+                    if tree.exists(filename):
+                        tree.delete(filename)
+        search_term = self.search_entry.get().strip().lower() if tree is not None else ""
+        for filename, prompt_data in loaded:
+            for index, prompt in enumerate(self.prompts):
+                if prompt[0] == filename:
+                    self.prompts[index] = (filename, prompt_data)
+                    break
+            else:
+                self.prompts.append((filename, prompt_data))
+            if tree is not None:
+                values = (filename, prompt_data["content"][:50] + "...")
+                if tree.exists(filename):
+                    tree.item(filename, values=values)
+                elif self.matches((filename, prompt_data), search_term):
+                    tree.insert("", tk.END, iid=filename, values=values)
 
     def open_prompts_manager(self):
         """打开 Prompts 管理界面"""
@@ -179,16 +212,20 @@ class PromptsManager:
         self.tree.delete(*self.tree.get_children())
 
         for prompt in self.prompts:
-            prompt_name = prompt[0].lower()
-            prompt_content = prompt[1]["content"].lower()
-            if search_term in prompt_name or search_term in prompt_content:
-                self.tree.insert("", tk.END, values=(prompt[0], prompt[1]["content"][:50] + "..."))
+            if self.matches(prompt, search_term):
+                self.tree.insert("", tk.END, iid=prompt[0], values=(prompt[0], prompt[1]["content"][:50] + "..."))
+
+    @staticmethod
+    def matches(prompt, search_term):
+        """Prompt 的名称或内容是否包含搜索词"""
+        return search_term in prompt[0].lower() or search_term in prompt[1]["content"].lower()
 
     def update_treeview(self):
         """更新 Treeview 显示内容"""
         self.tree.delete(*self.tree.get_children())
         for prompt in self.prompts:
-            self.tree.insert("", tk.END, values=(prompt[0], prompt[1]["content"][:50] + "..."))
+            # 以文件名作为节点 id，目录变化时可直接定位到对应的行
+            self.tree.insert("", tk.END, iid=prompt[0], values=(prompt[0], prompt[1]["content"][:50] + "..."))
 
     def open_selected_prompt(self):
         """打开已加载的 Prompts 文件"""
@@ -56,9 +56,10 @@ class SystemPromptManager:
         if system_message_index != -1:
             # 如果存在 system 消息，更新其内容
             self.main_app.conversation_history[system_message_index]["content"] = new_system_prompt
+            self.main_app.journal.record(self.main_app.conversation_history)
         else:
-            # 如果不存在 system 消息，插入到对话历史的最前面
-            self.main_app.conversation_history.insert(0, {"role": "system", "content": new_system_prompt})
+            # 如果不存在 system 消息，插入到对话历史的最前面（由主程序同步聊天记录中的下标）
+            self.main_app.insert_history_message(0, {"role": "system", "content": new_system_prompt})
 
         messagebox.showinfo("成功", "系统提示词已更新并立即生效")
         self.system_prompt_window.destroy()
@@ -0,0 +1,27 @@
+from chat_view.syntax_highlight import tokenize
+
+
+def test_unterminated_docstring_extends_to_end():
+    code = 'def f():\n    """第一行\n    第二行\n    x = 1\n'
+    start = code.index('"""')
+    assert tokenize("python", code)["hl_string"] == [(start, len(code))]
+
+
+def test_terminated_docstring_spans_lines():
+    code = 'x = """a\nb"""\ny = 2\n'
+    start = code.index('"""')
+    end = code.rindex('"""') + 3
+    assert (start, end) in tokenize("python", code)["hl_string"]
+
+
+def test_unterminated_block_comment_extends_to_end():
+    for language in ("c", "javascript", "sql"):
+        code = "int a; /* 第一行\n第二行\nreturn 0;\n"
+        assert tokenize(language, code)["hl_comment"] == [(code.index("/*"), len(code))]
+
+
+def test_block_comment_spans_lines():
+    code = "/* a\nb */ int x;\n"
+    ranges = tokenize("c", code)
+    assert ranges["hl_comment"] == [(0, code.index("*/") + 2)]
+    assert (code.index("int"), code.index("int") + 3) in ranges["hl_keyword"]